@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from scripts.tracing import start_rerun, end_rerun
 
 # Configuration de la page
 st.set_page_config(page_title="SmartSDGTunisia", page_icon="🇹🇳", layout="wide")
 
+# Durées des étapes de ce rerun (scripts/tracing.py)
+start_rerun("Accueil")
+
 # 🎨 Palette de couleurs
 COLORS = {
     "sky_blue": "#00B4D8",
@@ -154,7 +158,8 @@ with st.container():
             'Indicateur Clé': ['Éducation', 'Emploi', 'Santé', 'Agriculture', 'Environnement']
         })
         
-        fig = px.scatter_mapbox(
+        # scatter_map (MapLibre) remplace scatter_mapbox, retiré de Plotly
+        fig = px.scatter_map(
             tunisia_data,
             lat="Latitude",
             lon="Longitude",
@@ -170,7 +175,7 @@ with st.container():
                 COLORS['vivid_orange'], COLORS['raspberry_pink'], COLORS['soft_purple']
             ]
         )
-        fig.update_layout(mapbox_style="carto-positron", margin={"r":0,"t":0,"l":0,"b":0})
+        fig.update_layout(map_style="carto-positron", margin={"r":0,"t":0,"l":0,"b":0})
         st.plotly_chart(fig, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
     
@@ -203,4 +208,6 @@ with st.container():
     
     # Pied de page
     st.markdown("<div class='footer'>© 2023 SmartSDGTunisia - Plateforme ODD Tunisie</div>", unsafe_allow_html=True)
-    st.markdown("</div>", unsafe_allow_html=True)  # Fermeture du main-container
\ No newline at end of file
+    st.markdown("</div>", unsafe_allow_html=True)  # Fermeture du main-container
+
+end_rerun()
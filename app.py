@@ -1,4 +1,5 @@
 import streamlit as st
+from scripts.warmup import start_warmup
 
 # Configuration globale
 st.set_page_config(
@@ -7,5 +8,18 @@ st.set_page_config(
     layout="wide"
 )
 
-# Tu peux aussi ajouter un message ou un redirigeur vers Accueil si tu veux
-st.switch_page("pages/Accueil.py")  # Affiche la page d'accueil au démarrage
+# Caches partagés (fonds de carte, index spatial, classeur bio) remplis en arrière-plan
+# dès la première connexion, pendant que l'accueil s'affiche
+start_warmup()
+
+# Chaque page n'importe ses bibliothèques (geopandas, folium...) qu'à sa première ouverture
+pages = [
+    st.Page("Accueil.py", title="Accueil", icon="🏠", default=True),
+    st.Page("pages/Pluviometrie.py"),
+    st.Page("pages/Repartition_Biol.py"),
+    st.Page("pages/Cultures.py"),
+    st.Page("pages/Animaux.py"),
+    st.Page("pages/Barrages.py"),
+    st.Page("pages/Climat.py"),
+]
+st.navigation(pages).run()
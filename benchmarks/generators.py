@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pandas as pd
+from scripts.data_utils import hydro_year
+
+# Jeux de données synthétiques à l'échelle nationale pour les benchmarks :
+# une station par nom arabe de délégation (del_ar), relevés journaliers sur
+# plusieurs années hydrologiques, au format des CSV importés dans Pluviometrie
+SCALES = {
+    "small": {"stations": 24, "years": 5},
+    "full": {"stations": None, "years": 30},
+}
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+FIRST_YEAR = 1995
+
+# Probabilité d'un jour de pluie selon le mois (hiver pluvieux, été sec)
+WET_DAY_PROBABILITY = np.array([0.30, 0.28, 0.25, 0.20, 0.12, 0.05,
+                                0.02, 0.03, 0.10, 0.18, 0.24, 0.30])
+
+def station_names(gdf_del, n=None):
+    """Noms arabes des délégations (sans doublons), pour que chaque station soit rattachée par le gazetteer."""
+    names = pd.unique(gdf_del['del_ar'].dropna().astype(str))
+    return list(names[:n] if n else names)
+
+def synthetic_rainfall(stations, years, first_year=FIRST_YEAR, seed=0):
+    """Relevés journaliers de `stations` sur `years` années hydrologiques (à partir du 1er septembre).
+
+    La pluie du jour suit une loi gamma sur les jours de pluie ; les cumuls
+    (mois, depuis le 1er septembre) sont cohérents avec elle.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(f"{first_year}-09-01", f"{first_year + years}-08-31", freq="D")
+    n_days, n_stations = len(dates), len(stations)
+
+    # Station plus ou moins pluvieuse (nord humide, sud sec)
+    wetness = rng.uniform(0.3, 1.6, n_stations)
+    probability = WET_DAY_PROBABILITY[dates.month.to_numpy() - 1]
+    wet = rng.random((n_stations, n_days)) < probability * wetness[:, None]
+    amounts = rng.gamma(0.8, 9.0, (n_stations, n_days)) * wetness[:, None]
+    rain = np.round(np.where(wet, amounts, 0.0), 1).astype("float32")
+
+    df = pd.DataFrame({
+        'Date': np.tile(dates.to_numpy(), n_stations),
+        'station': np.repeat(np.asarray(stations, dtype=object), n_days),
+        'Pluvio_du_jour': rain.ravel(),
+    })
+    keys = [df['station']]
+    df['Cumul_du_mois'] = df.groupby(keys + [df['Date'].dt.to_period('M')], sort=False)['Pluvio_du_jour'].cumsum().round(1)
+    df['Cumul_periode'] = df.groupby(keys + [hydro_year(df['Date'])], sort=False)['Pluvio_du_jour'].cumsum().round(1)
+    return df
+
+def rainfall_csv(gdf_del, scale="full", seed=0):
+    """Chemin du CSV synthétique de l'échelle `scale`, généré au premier appel puis réutilisé."""
+    params = SCALES[scale]
+    path = os.path.join(DATA_DIR, f"pluviometrie-{scale}-{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        df = synthetic_rainfall(station_names(gdf_del, params["stations"]), params["years"], seed=seed)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        df.to_csv(tmp, index=False, date_format="%Y-%m-%d", float_format="%.1f")
+        os.replace(tmp, path)
+    return path
+
+def random_clicks(gdf_del, n, seed=0):
+    """`n` clics {'lat', 'lng'} tirés dans l'emprise des délégations (certains en mer)."""
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = gdf_del.total_bounds
+    return [{'lat': float(lat), 'lng': float(lng)}
+            for lng, lat in zip(rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n))]
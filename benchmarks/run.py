@@ -0,0 +1,199 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+import pandas as pd
+
+# Benchmarks des étapes coûteuses de l'application, sur données synthétiques :
+#   python -m benchmarks.run --scale full --label v1.2
+# Chaque exécution est enregistrée dans benchmarks/results/<label>.json et
+# comparée à la précédente (ou à --baseline) : un cas plus lent de plus de
+# --threshold est signalé comme régression.
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_THRESHOLD = 1.25
+
+class Upload:
+    """Équivalent minimal du fichier renvoyé par st.file_uploader."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.name = os.path.basename(path)
+
+    def getvalue(self):
+        return self.data
+
+def measure(function, repeat, setup=None):
+    """Durées (s) de `repeat` appels à `function`, `setup` étant exécuté hors chronomètre avant chacun."""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_cases(scale, repeat, clicks):
+    """Chronomètre chaque étape ; retourne {cas: {"runs": [...], ...}}."""
+    # Imports ici : les modules de l'application lisent leur configuration à l'import
+    from scripts import rain_store
+    from scripts.chart_utils import downsample
+    from scripts.dashboard import rain_matrix
+    from scripts.data_utils import frame_digest, load_pluviometry, parse_pluviometry
+    from scripts.gazetteer import station_index_for
+    from scripts.geo_utils import load_geodata, load_spatial_index, find_clicked_location
+    from scripts.registry import REGISTRY
+    from benchmarks.generators import rainfall_csv, random_clicks
+
+    cases = {}
+
+    def record(name, timings, **extra):
+        cases[name] = {"runs": timings, **extra}
+        print(f"  {name:<32} médiane {statistics.median(timings) * 1000:10.1f} ms", flush=True)
+
+    # Fonds de carte (GeoParquet compilé, hors cache Streamlit)
+    record("load_geodata", measure(load_geodata, repeat, setup=lambda: REGISTRY.reload(["geodata"], force=True)))
+    gdf_gouv, gdf_del = load_geodata()
+
+    # Clic sur la carte : délégation et gouvernorat retrouvés par clic (index spatial déjà construit)
+    points = random_clicks(gdf_del, clicks)
+    load_spatial_index()
+    timings = measure(lambda: [find_clicked_location(p) for p in points], repeat)
+    record("find_clicked_location", [t / clicks for t in timings], clicks=clicks)
+
+    # Lecture du CSV (parse, tri, recalcul des cumuls)
+    path = rainfall_csv(gdf_del, scale)
+    upload = Upload(path)
+    record("load_pluviometry", measure(lambda: load_pluviometry(upload), repeat, setup=parse_pluviometry.clear),
+           rows=None, size_mb=round(len(upload.data) / 1e6, 1))
+    df = load_pluviometry(upload)
+    cases["load_pluviometry"]["rows"] = len(df)
+    station_index = station_index_for(df, gdf_del)
+
+    # Filtrage sur la période (dernière année hydrologique), comme dans Pluviometrie :
+    # en mémoire (repli sans entrepôt) puis dans l'entrepôt Parquet, écrit dans un
+    # répertoire temporaire pour ne pas toucher à data/store
+    end = df['Date'].max()
+    start = end - pd.Timedelta(days=364)
+    def filter_in_memory():
+        lower, upper = pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)
+        return df[(df['Date'] >= lower) & (df['Date'] < upper)]
+    record("select_period (mémoire)", measure(filter_in_memory, repeat))
+
+    store_dir = tempfile.mkdtemp(prefix="smartsdg-bench-")
+    saved = rain_store.STORE_DIR, rain_store.UPLOADS_DIR, rain_store.VERSION_FILE
+    rain_store.STORE_DIR = store_dir
+    rain_store.UPLOADS_DIR = os.path.join(store_dir, "_uploads")
+    rain_store.VERSION_FILE = os.path.join(store_dir, "_version")
+    try:
+        record("ingest_upload (entrepôt)", measure(lambda: rain_store.ingest_upload(df), 1))
+        record("select_period (entrepôt)", measure(lambda: rain_store.select_period(df, start, end), repeat))
+        period = rain_store.select_period(df, start, end)
+    finally:
+        rain_store.STORE_DIR, rain_store.UPLOADS_DIR, rain_store.VERSION_FILE = saved
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+    # Préparation des données de show_dashboard pour la délégation la mieux
+    # pourvue, sur tout l'historique (pire cas) : filtre, derniers relevés, réduction
+    del_id = max(station_index['del_to_stations'], key=lambda d: len(station_index['del_to_stations'][d]))
+    stations = station_index['del_to_stations'][del_id]
+    def dashboard_prep():
+        station_data = df[df['station'].isin(stations)]
+        station_data.groupby('station', observed=True).tail(1)[['Pluvio_du_jour', 'Cumul_du_mois', 'Cumul_periode']].mean()
+        return downsample(frame_digest(station_data), station_data, "line")
+    record("show_dashboard (préparation)", measure(dashboard_prep, repeat, setup=downsample.clear))
+    record("carte thermique (période)", measure(lambda: rain_matrix(frame_digest(period), period), repeat, setup=rain_matrix.clear))
+    record("carte thermique (historique)", measure(lambda: rain_matrix(frame_digest(df), df), repeat, setup=rain_matrix.clear))
+    return cases
+
+def summarize(cases):
+    for case in cases.values():
+        case["median_s"] = statistics.median(case["runs"])
+        case["min_s"] = min(case["runs"])
+    return cases
+
+def previous_result(scale):
+    """Dernier résultat enregistré pour la même échelle (lu avant d'écrire le nouveau)."""
+    candidates = []
+    for path in glob.glob(os.path.join(RESULTS_DIR, "*.json")):
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        if result.get("scale") == scale:
+            candidates.append((result.get("date", ""), result))
+    return max(candidates, key=lambda c: c[0])[1] if candidates else None
+
+def compare(result, baseline, threshold):
+    """Affiche l'évolution de chaque cas ; retourne la liste des régressions."""
+    regressions = []
+    print(f"\nComparaison avec {baseline['label']} ({baseline.get('git') or '?'}) :")
+    for name, case in result["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            print(f"  {name:<32} nouveau")
+            continue
+        ratio = case["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        flag = "  RÉGRESSION" if ratio > threshold else ""
+        print(f"  {name:<32} x{ratio:5.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks SmartSDGTunisia sur données synthétiques")
+    parser.add_argument("--scale", choices=["small", "full"], default="full")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--clicks", type=int, default=200)
+    parser.add_argument("--label", help="nom du fichier de résultats (défaut : révision git)")
+    parser.add_argument("--baseline", help="fichier de résultats de référence (défaut : le précédent)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings("ignore")
+    revision = git_revision()
+    label = args.label or f"{revision or 'local'}-{args.scale}"
+    print(f"Benchmarks ({args.scale}, {args.repeat} répétitions) :")
+    result = {
+        "label": label,
+        "git": revision,
+        "date": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "scale": args.scale,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "cases": summarize(run_cases(args.scale, args.repeat, args.clicks)),
+    }
+
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    else:
+        baseline = previous_result(args.scale)
+    regressions = compare(result, baseline, args.threshold) if baseline else []
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\nRésultats enregistrés dans {path}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
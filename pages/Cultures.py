@@ -1,54 +1,85 @@
+import html
 import streamlit as st
-import geopandas as gpd
-import ssl
-import urllib.request
-from tempfile import NamedTemporaryFile
 import folium
-from streamlit_folium import st_folium
+from scripts.download_cache import download
+from scripts.map_utils import st_folium_cached
+from scripts.zones import PAGE_SIZES, ZONE_TOLERANCE, prepare_zones, search_zones, page_of, zone_layer
+from scripts.tracing import start_rerun, end_rerun, traced, cache_miss
 
 st.set_page_config(page_title="Zones d'intervention ODESYPANO", layout="wide")
 
-st.title("🌍 Zones d’intervention de l’ODESYPANO")
+# Durées des étapes de ce rerun (scripts/tracing.py)
+start_rerun("Cultures")
 
-# Bypass SSL verification (temporairement)
-ssl._create_default_https_context = ssl._create_unverified_context
+st.title("🌍 Zones d’intervention de l’ODESYPANO")
 
 # URL du fichier GeoJSON
 geojson_url = "https://catalog.agridata.tn/dataset/205de34c-9c7d-497a-a6ce-b66db34a3f97/resource/cc21dad7-1f59-4680-914e-788dca2cc40a/download/z_interv_pno4.geojson"
 
+# GeoJSON lu depuis le cache disque des téléchargements (relu seulement si sa version change)
+@traced("load_geojson", cache=True)
 @st.cache_data(show_spinner=True)
-def load_geojson_from_url(url):
-    with urllib.request.urlopen(url) as response:
-        with NamedTemporaryFile(delete=False, suffix=".geojson") as tmp_file:
-            tmp_file.write(response.read())
-            return gpd.read_file(tmp_file.name)
+@cache_miss
+def load_geojson(path, version):
+    import geopandas as gpd  # importé seulement quand le fichier doit être relu
+    return gpd.read_file(path)
 
 # Chargement des données
-gdf = load_geojson_from_url(geojson_url)
+try:
+    geojson_path, geojson_version = download(geojson_url)
+    gdf = load_geojson(geojson_path, geojson_version)
+except OSError as e:
+    st.error(f"❌ Impossible de télécharger les données depuis Agridata.tn : {e}")
+    end_rerun()
+    st.stop()
+
+# Fiches nettoyées une seule fois par version du fichier
+zones = prepare_zones(geojson_version, gdf)
 
-st.success("✅ Données chargées avec succès")
+st.success(f"✅ Données chargées avec succès ({len(zones)} zones)")
 
 # Affichage des informations de base
 st.subheader("Aperçu des données")
 
-# Pour chaque ligne, afficher la description avec un rendu HTML
-for index, row in gdf.iterrows():
-    st.write(f"**Nom de la zone**: {row['Name']}")
-    st.markdown(row['description'], unsafe_allow_html=True)
-    st.write("\n---\n")
+# Recherche et pagination : seule la page courante est rendue
+col_search, col_size = st.columns([3, 1])
+with col_search:
+    query = st.text_input("🔎 Rechercher une zone", placeholder="Nom ou mot de la description")
+with col_size:
+    page_size = st.selectbox("Zones par page", options=PAGE_SIZES, index=0)
+
+found = search_zones(zones, query)
+page_count = max(1, -(-len(found) // page_size))
+page = st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+st.caption(f"{len(found)} zone(s) trouvée(s)")
+
+# Descriptions déjà nettoyées (balises de mise en forme uniquement), noms échappés : une seule sortie pour la page
+st.markdown(
+    "\n\n---\n\n".join(
+        f"**Nom de la zone**: {html.escape(name)}\n\n{description}"
+        for name, description in page_of(found, page, page_size)[["name", "html"]].itertuples(index=False)
+    ),
+    unsafe_allow_html=True
+)
 
 # Création d'une carte Folium
 st.subheader("🗺️ Visualisation des zones sur la carte")
-m = folium.Map(location=[34.5, 9.5], zoom_start=7)
 
-# Ajout des zones depuis GeoJSON
-folium.GeoJson(
-    gdf,
-    name="Zones ODESYPANO",
-    tooltip=folium.GeoJsonTooltip(fields=gdf.columns[:2].tolist(), aliases=["Champ 1", "Champ 2"])
-).add_to(m)
+# Contours simplifiés, rendus une fois par version du fichier
+map_config = {"zones": geojson_version, "tolerance": ZONE_TOLERANCE}
+
+def build_map():
+    m = folium.Map(location=[34.5, 9.5], zoom_start=7)
+    layer = zone_layer(geojson_version, gdf)
+    # Ajout des zones depuis GeoJSON
+    folium.GeoJson(
+        layer,
+        name="Zones ODESYPANO",
+        tooltip=folium.GeoJsonTooltip(fields=["Name"], aliases=["Zone"]) if "Name" in layer else None
+    ).add_to(m)
+    return m
 
 # Affichage avec streamlit-folium
-st_folium(m, width=1200, height=600)
+st_folium_cached(map_config, build_map, key="zones_map", width=1200, height=600, returned_objects=[])
 
-print(gdf.columns)
+end_rerun()
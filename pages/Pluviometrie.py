@@ -1,11 +1,18 @@
 import streamlit as st
 import folium
 import datetime
+from functools import partial
 import pandas as pd
-from streamlit_folium import st_folium
-from scripts.geo_utils import load_geodata, find_clicked_delegation
-from scripts.data_utils import load_pluviometry
-from scripts.dashboard import show_dashboard
+from scripts.geo_utils import LOD_LEVELS, load_geodata, load_boundaries, level_for_zoom, find_clicked_location
+from scripts.data_utils import load_pluviometry, data_key
+from scripts.rain_store import select_period, append_period
+from scripts.dashboard import show_dashboard, show_summary, heatmap_figure
+from scripts.gazetteer import station_index_for
+from scripts.rollups import update_rollups, load_cube, stations_per_area, rainfall_by_delegation
+from scripts.map_utils import KeepView, st_folium_cached, choropleth_styles
+from scripts.registry import REGISTRY
+from scripts.tile_server import VECTOR_TILES_ENABLED, VectorTileLayer, start_tile_server
+from scripts.tracing import start_rerun, end_rerun
 
 # --- Configuration de la page ---
 st.set_page_config(
@@ -15,6 +22,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Durées des étapes de ce rerun (scripts/tracing.py)
+start_rerun("Pluviometrie")
+
 
 # 🎨 Palette de couleurs cohérente
 COLORS = {
@@ -162,6 +172,7 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 df_pluvio = ""
+station_index = None
 
 # --- Navbar Personnalisée ---
 st.markdown("""
@@ -176,6 +187,7 @@ st.markdown("""
 
 # --- Chargement des données géographiques ---
 gdf_gouv, gdf_del = load_geodata()
+gouv_names = dict(zip(gdf_del['gouv_id'], gdf_del['gouv_fr']))
 
 # --- Sidebar Redesign ---
 with st.sidebar:
@@ -227,6 +239,14 @@ with st.sidebar:
         </div>
     """, unsafe_allow_html=True)
     
+    import_mode = st.radio(
+        "Mode d'import",
+        options=["Historique complet", "Bulletin journalier (ajout)"],
+        horizontal=True,
+        key="import_mode",
+        help="Un bulletin n'ajoute que ses jours aux données déjà importées (doublons station/date remplacés)"
+    )
+
     uploaded_file = st.file_uploader(
         "Choisir un fichier CSV",
         type=['csv'],
@@ -315,6 +335,24 @@ with st.sidebar:
         index=0,
         label_visibility="collapsed"
     )
+
+    choropleth = st.checkbox(
+        "Colorer les délégations par cumul",
+        value=False,
+        help="Cumul moyen des stations de chaque délégation sur la période choisie"
+    )
+
+    # Niveau de détail des contours : selon le zoom de la carte, ou imposé
+    # (les tuiles vectorielles ont leur propre pyramide, selon le zoom)
+    detail_labels = ["Automatique", *["National", "Régional", "Local"][:len(LOD_LEVELS)]]
+    detail = detail_labels[0]
+    if not VECTOR_TILES_ENABLED:
+        detail = st.select_slider(
+            "Détail des contours",
+            options=detail_labels,
+            value=detail_labels[0],
+            help="Automatique : selon le zoom de la carte ; sinon niveau imposé (contours précis = carte plus lourde)"
+        )
     
     # Bouton d'analyse
     analyze_btn = st.button(
@@ -328,12 +366,22 @@ with st.sidebar:
     
     # Section Status
     if uploaded_file is not None:
-        df_pluvio = load_pluviometry(uploaded_file)
+        # Un bulletin seul ne permet pas de recalculer les cumuls : ils sont prolongés à l'ajout
+        df_pluvio = load_pluviometry(uploaded_file, derive=import_mode != "Bulletin journalier (ajout)")
         if df_pluvio is not None:
-            df_pluvio = df_pluvio[
-                (df_pluvio['Date'].dt.date >= start_date) &
-                (df_pluvio['Date'].dt.date <= end_date)
-            ]
+            # Rattachement stations -> délégations, calculé une fois par jeu de données
+            station_index = station_index_for(df_pluvio, gdf_del)
+            cumul_mismatches = int(df_pluvio['Cumul_incoherent'].sum()) if 'Cumul_incoherent' in df_pluvio else 0
+            on_change = partial(update_rollups, station_index=station_index, gdf_del=gdf_del)
+
+            if import_mode == "Bulletin journalier (ajout)":
+                # Seuls les jours du bulletin sont écrits ; cumuls et agrégats sont prolongés
+                df_pluvio = append_period(df_pluvio, start_date, end_date, on_change=on_change)
+                station_index = station_index_for(df_pluvio, gdf_del)
+            else:
+                # Lecture de la période dans l'entrepôt Parquet (partitions station/année) ;
+                # un nouveau fichier met à jour le cube d'agrégats de façon incrémentale
+                df_pluvio = select_period(df_pluvio, start_date, end_date, on_change=on_change)
             
             st.markdown(f"""
             <div style="
@@ -367,6 +415,13 @@ with st.sidebar:
                 </p>
             </div>
             """, unsafe_allow_html=True)
+
+            if cumul_mismatches:
+                st.warning(f"⚠️ {cumul_mismatches:,} relevé(s) avec des cumuls incohérents dans le fichier : cumuls recalculés")
+
+            if station_index['unmatched']:
+                with st.expander(f"⚠️ {len(station_index['unmatched'])} station(s) sans délégation"):
+                    st.write(", ".join(station_index['unmatched']))
         else:
             st.error("❌ Format de fichier invalide")
 
@@ -398,14 +453,10 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-# --- Création de la carte Folium ---
-m = folium.Map(
-    location=[34, 9], 
-    zoom_start=6, 
-    tiles="cartodbpositron",
-    width="100%",
-    height="100%"
-)
+# --- Niveau de détail des contours selon le zoom courant de la carte ---
+# Seul le zoom est renvoyé par la carte : un déplacement ne relance pas la page
+map_zoom = (st.session_state.get("pluvio_map") or {}).get("zoom") or 6
+map_level = level_for_zoom(map_zoom) if detail == detail_labels[0] else detail_labels.index(detail) - 1
 
 # Style des couches cohérent avec la palette
 style_del = {
@@ -422,81 +473,161 @@ style_gouv = {
     'fillOpacity': 0.3
 }
 
-# Couche Délégations
-folium.GeoJson(
-    gdf_del,
-    name="Délégations",
-    style_function=lambda x: style_del,
-    tooltip=folium.GeoJsonTooltip(
-        fields=['del_fr', 'gouv_fr'],
-        aliases=["Délégation:", "Gouvernorat:"],
-        style=f"""
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background-color: white;
-            color: {COLORS['dark_blue']};
-            padding: 8px;
-            border-radius: 4px;
-            box-shadow: 0 2px 6px rgba(0,0,0,0.1);
-            font-size: 13px;
-        """
+tooltip_style = f"""
+    font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+    background-color: white;
+    color: {COLORS['dark_blue']};
+    padding: 8px;
+    border-radius: 4px;
+    box-shadow: 0 2px 6px rgba(0,0,0,0.1);
+    font-size: 13px;
+"""
+
+# Tout ce qui détermine le rendu de la carte : tant que cette configuration ne
+# change pas, la carte n'est ni reconstruite ni re-sérialisée
+map_config = {
+    "level": map_level,
+    "data": REGISTRY.version("geodata"),
+    "vector_tiles": VECTOR_TILES_ENABLED,
+    "layers": ["Délégations", "Gouvernorats"],
+    "style_del": style_del,
+    "style_gouv": style_gouv,
+    "tooltip_del": (['del_fr', 'gouv_fr'], ["Délégation:", "Gouvernorat:"]),
+    "tooltip_gouv": (['gouv_fr'], ["Gouvernorat:"]),
+    "tooltip_style": tooltip_style,
+}
+
+# Choroplèthe : seules les couleurs changent avec la période, appliquées dans le
+# navigateur sur la couche déjà affichée (la géométrie n'est pas renvoyée)
+colormap = None
+restyle_del = {}
+if choropleth and isinstance(df_pluvio, pd.DataFrame) and station_index is not None and not df_pluvio.empty:
+    totals = rainfall_by_delegation(data_key(df_pluvio), df_pluvio, station_index)
+    restyle_del, colormap = choropleth_styles(
+        totals, style_del,
+        colors=["#E6F3FF", COLORS['sky_blue'], COLORS['dark_blue']],
+        caption="Cumul moyen (mm)"
     )
-).add_to(m)
-
-# Couche Gouvernorats
-folium.GeoJson(
-    gdf_gouv,
-    name="Gouvernorats",
-    style_function=lambda x: style_gouv,
-    tooltip=folium.GeoJsonTooltip(
-        fields=['gouv_fr'],
-        aliases=["Gouvernorat:"],
-        style=f"""
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background-color: white;
-            color: {COLORS['dark_blue']};
-            padding: 8px;
-            border-radius: 4px;
-            box-shadow: 0 2px 6px rgba(0,0,0,0.1);
-            font-size: 13px;
-        """
+restyle = {"Délégations": ("del_id", restyle_del, style_del)}
+
+# --- Création de la carte Folium ---
+def build_map():
+    m = folium.Map(
+        location=[34, 9], 
+        zoom_start=6, 
+        tiles="cartodbpositron",
+        width="100%",
+        height="100%"
     )
-).add_to(m)
 
-# Contrôle des layers
-folium.LayerControl(collapsed=False, position='topright').add_to(m)
+    if VECTOR_TILES_ENABLED:
+        # Tuiles vectorielles servies localement : seules les tuiles visibles sont chargées
+        tiles_base = start_tile_server()
+        VectorTileLayer(
+            tiles_base, "delegations", style_del,
+            tooltip_fields=['del_fr', 'gouv_fr'],
+            tooltip_aliases=["Délégation:", "Gouvernorat:"],
+            name="Délégations"
+        ).add_to(m)
+        VectorTileLayer(
+            tiles_base, "gouvernorats", style_gouv,
+            tooltip_fields=['gouv_fr'],
+            tooltip_aliases=["Gouvernorat:"],
+            name="Gouvernorats"
+        ).add_to(m)
+    else:
+        gdf_gouv_lod, gdf_del_lod = load_boundaries(map_level)
+
+        # Couche Délégations
+        folium.GeoJson(
+            gdf_del_lod,
+            name="Délégations",
+            style_function=lambda x: style_del,
+            tooltip=folium.GeoJsonTooltip(
+                fields=['del_fr', 'gouv_fr'],
+                aliases=["Délégation:", "Gouvernorat:"],
+                style=tooltip_style
+            )
+        ).add_to(m)
+
+        # Couche Gouvernorats
+        folium.GeoJson(
+            gdf_gouv_lod,
+            name="Gouvernorats",
+            style_function=lambda x: style_gouv,
+            tooltip=folium.GeoJsonTooltip(
+                fields=['gouv_fr'],
+                aliases=["Gouvernorat:"],
+                style=tooltip_style
+            )
+        ).add_to(m)
+
+    # Contrôle des layers
+    folium.LayerControl(collapsed=False, position='topright').add_to(m)
+    # Une carte reconstruite (autre niveau de détail) garde le centre et le zoom courants
+    KeepView("pluvio_map").add_to(m)
+    return m
 
 # --- Layout Principal ---
 col1, col2 = st.columns([2, 1], gap="medium")
 
 with col1:
     st.markdown(f"<h2 class='section-title'>🗺️ Carte Interactive</h2>", unsafe_allow_html=True)
-    map_data = st_folium(
-        m, 
+    map_data = st_folium_cached(
+        map_config,
+        build_map,
+        key="pluvio_map",
         height=700, 
         width="100%", 
-        returned_objects=["last_object_clicked"]
+        returned_objects=["last_object_clicked", "last_clicked", *([] if VECTOR_TILES_ENABLED else ["zoom"])],
+        restyle=restyle
     )
+    # Un changement de niveau de détail recrée la carte : le dernier clic est
+    # conservé pour garder la délégation sélectionnée
+    if map_data and (map_data.get("last_object_clicked") or map_data.get("last_clicked")):
+        st.session_state["pluvio_click"] = map_data
+    else:
+        map_data = st.session_state.get("pluvio_click", map_data)
+    if colormap is not None:
+        st.markdown(colormap._repr_html_(), unsafe_allow_html=True)
+        st.caption(f"Cumul moyen par station sur la période, {len(restyle_del)} délégations renseignées")
 
 with col2:
     st.markdown(f"<h2 class='section-title'>📈 Dashboard</h2>", unsafe_allow_html=True)
     clicked_properties = None
+    # Clic hors délégation résolu à un gouvernorat : synthèse régionale seulement
+    regional_summary = False
 
     if map_data and "last_object_clicked" in map_data:
-        clicked_delegation = find_clicked_delegation(map_data["last_object_clicked"], gdf_del)
-        clicked_gouv = find_clicked_delegation(map_data["last_object_clicked"], gdf_gouv)
+        # Les tuiles vectorielles ne remontent que les coordonnées du clic
+        click_coords = map_data["last_object_clicked"]
+        if VECTOR_TILES_ENABLED:
+            click_coords = click_coords or map_data.get("last_clicked")
+
+        # Délégation et gouvernorat résolus en une seule requête sur l'index spatial
+        clicked_delegation, clicked_gouv = find_clicked_location(click_coords)
 
         if clicked_delegation is not None:
             clicked_properties = {
+                'del_id': clicked_delegation['del_id'],
                 'del_ar': clicked_delegation['del_ar'],
                 'del_fr': clicked_delegation['del_fr'],
                 'gouv_fr': clicked_delegation['gouv_fr']
             }
-            show_dashboard(clicked_properties, df_pluvio, graph_type)
+            show_dashboard(clicked_properties, df_pluvio, graph_type, station_index)
         elif clicked_gouv is not None:
+            regional_summary = True
             st.info(f"📍 Gouvernorat sélectionné : {clicked_gouv['gouv_fr']}")
+            if station_index is not None:
+                show_summary(load_cube(), stations_per_area(station_index, gdf_del), gouv_names, clicked_gouv['gouv_id'])
     
-    if clicked_properties is None:
+    if clicked_properties is None and not regional_summary:
         show_dashboard(None, df_pluvio, graph_type)
+        if graph_type == "Carte thermique" and isinstance(df_pluvio, pd.DataFrame) and not df_pluvio.empty:
+            # Toutes les stations du fichier, sur toute la période choisie
+            st.plotly_chart(heatmap_figure(df_pluvio, "Pluviométrie nationale par station"), use_container_width=True)
+        if station_index is not None:
+            show_summary(load_cube(), stations_per_area(station_index, gdf_del), gouv_names)
 
 # --- Pied de page ---
 st.markdown(f"""
@@ -515,4 +646,6 @@ st.markdown(f"""
         Données fournies par l'INS Tunisie et les partenaires techniques
     </span>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+end_rerun()
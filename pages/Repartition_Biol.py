@@ -1,11 +1,13 @@
 import streamlit as st
 import folium
-import pandas as pd
-from streamlit_folium import st_folium
-import geopandas as gpd
-from shapely.geometry import Point
-from scripts.geo_utils import load_geodata
-from scripts.data_utils import load_pluviometry
+from scripts.geo_utils import load_geodata, load_gouvernorats, find_clicked_gouvernorat
+from scripts.gazetteer import gouv_index_for
+from scripts.data_utils import frame_digest
+from scripts.bio_utils import BIO_PATH, BIO_ID, load_bio_data, bio_indicators, top_n, indicator_row, indicator_by_gouv, as_int
+from scripts.map_utils import st_folium_cached, choropleth_styles
+from scripts.registry import REGISTRY
+from scripts.tile_server import VECTOR_TILES_ENABLED, VectorTileLayer, start_tile_server
+from scripts.tracing import start_rerun, end_rerun
 
 # --- Configuration de la page ---
 st.set_page_config(
@@ -15,6 +17,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Durées des étapes de ce rerun (scripts/tracing.py)
+start_rerun("Repartition_Biol")
+
 # 🎨 Palette de couleurs cohérente
 COLORS = {
     "sky_blue": "#00B4D8",
@@ -190,26 +195,28 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 # --- Chargement des données ---
-gdf_gouv, gdf_del = load_geodata()
+_, gdf_del = load_geodata()
+gdf_gouv = load_gouvernorats()
 
-@st.cache_data
-def load_bio_data(file_path):
-    df_bio = pd.read_excel(file_path)
-    return df_bio
+df_bio = load_bio_data(BIO_PATH)
 
-df_bio = load_bio_data("data/repartition_bio.xlsx")
+# Jointure noms du fichier -> gouv_id (accents, casse, translittérations), en cache
+gouv_index = gouv_index_for(df_bio[BIO_ID].dropna().unique(), gdf_del)
+name_to_gouv = gouv_index['name_to_gouv']
 
-# --- Calcul des KPI globaux ---
-total_oliviers = df_bio['OLIVIER'].sum()
-total_palmiers = df_bio['PALMIER_DATTIER'].sum()
-gouvernorats_actifs = len(df_bio[df_bio['OLIVIER'] > 0])
-surface_forestiere = df_bio['foret'].sum()
-surface_arboriculture = df_bio['arboriculture'].sum()
-surface_agricole = df_bio[['arboriculture', 'maraichage', 'grandes_cultures']].sum().sum()
+# --- Indicateurs : totaux, parts et rangs de toutes les colonnes, calculés une fois ---
+bio_kpis = bio_indicators(frame_digest(df_bio), df_bio)
+totals = bio_kpis['totals']
+total_oliviers = totals['OLIVIER']
+total_palmiers = totals['PALMIER_DATTIER']
+gouvernorats_actifs = bio_kpis['active']['OLIVIER']
+surface_forestiere = totals['foret']
+surface_arboriculture = totals['arboriculture']
+surface_agricole = totals[['arboriculture', 'maraichage', 'grandes_cultures']].sum()
 
-# Top 3 des gouvernorats
-top_oliviers = df_bio.nlargest(3, 'OLIVIER')[['GOUVERNORAT', 'OLIVIER']]
-top_palmiers = df_bio.nlargest(3, 'PALMIER_DATTIER')[['GOUVERNORAT', 'PALMIER_DATTIER']]
+# Top 3 des gouvernorats (lus dans les rangs précalculés)
+top_oliviers = top_n(bio_kpis, 'OLIVIER')
+top_palmiers = top_n(bio_kpis, 'PALMIER_DATTIER')
 
 # --- Sidebar ---
 with st.sidebar:
@@ -229,6 +236,27 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
 
+    choropleth = st.checkbox(
+        "Colorer les gouvernorats par indicateur",
+        value=False,
+        help="Carte choroplèthe de l'indicateur choisi"
+    )
+    indicator = st.selectbox(
+        "Indicateur",
+        options=bio_kpis['indicators'],
+        disabled=not choropleth
+    )
+    measure = st.radio(
+        "Mesure",
+        options=["valeur", "part"],
+        format_func=lambda m: "Valeur" if m == "valeur" else "Part du national (%)",
+        horizontal=True,
+        disabled=not choropleth
+    )
+
+    if gouv_index['unmatched']:
+        st.warning("Gouvernorats absents de la carte : " + ", ".join(gouv_index['unmatched']))
+
 # --- En-tête Principal ---
 st.markdown(f"""
 <div style="background: white; padding: 25px; border-radius: 12px; margin-bottom: 30px; box-shadow: 0 4px 12px rgba(0,0,0,0.08);">
@@ -297,9 +325,9 @@ with col5:
         <h3 style="color:{COLORS['dark_blue']}">🏆 Top 3 Oliviers</h3>
         <table style="width:100%">
             <tr><th>Gouvernorat</th><th>Nombre</th><th>Part</th></tr>
-            <tr><td>{top_oliviers.iloc[0,0]}</td><td>{top_oliviers.iloc[0,1]:,}</td><td>{(top_oliviers.iloc[0,1]/total_oliviers*100):.1f}%</td></tr>
-            <tr><td>{top_oliviers.iloc[1,0]}</td><td>{top_oliviers.iloc[1,1]:,}</td><td>{(top_oliviers.iloc[1,1]/total_oliviers*100):.1f}%</td></tr>
-            <tr><td>{top_oliviers.iloc[2,0]}</td><td>{top_oliviers.iloc[2,1]:,}</td><td>{(top_oliviers.iloc[2,1]/total_oliviers*100):.1f}%</td></tr>
+            <tr><td>{top_oliviers.iloc[0,0]}</td><td>{top_oliviers.iloc[0,1]:,}</td><td>{top_oliviers.iloc[0,2]:.1f}%</td></tr>
+            <tr><td>{top_oliviers.iloc[1,0]}</td><td>{top_oliviers.iloc[1,1]:,}</td><td>{top_oliviers.iloc[1,2]:.1f}%</td></tr>
+            <tr><td>{top_oliviers.iloc[2,0]}</td><td>{top_oliviers.iloc[2,1]:,}</td><td>{top_oliviers.iloc[2,2]:.1f}%</td></tr>
         </table>
     </div>
     """, unsafe_allow_html=True)
@@ -310,9 +338,9 @@ with col6:
         <h3 style="color:{COLORS['dark_blue']}">🏆 Top 3 Palmiers</h3>
         <table style="width:100%">
             <tr><th>Gouvernorat</th><th>Nombre</th><th>Part</th></tr>
-            <tr><td>{top_palmiers.iloc[0,0]}</td><td>{top_palmiers.iloc[0,1]:,}</td><td>{(top_palmiers.iloc[0,1]/total_palmiers*100):.1f}%</td></tr>
-            <tr><td>{top_palmiers.iloc[1,0]}</td><td>{top_palmiers.iloc[1,1]:,}</td><td>{(top_palmiers.iloc[1,1]/total_palmiers*100):.1f}%</td></tr>
-            <tr><td>{top_palmiers.iloc[2,0]}</td><td>{top_palmiers.iloc[2,1]:,}</td><td>{(top_palmiers.iloc[2,1]/total_palmiers*100):.1f}%</td></tr>
+            <tr><td>{top_palmiers.iloc[0,0]}</td><td>{top_palmiers.iloc[0,1]:,}</td><td>{top_palmiers.iloc[0,2]:.1f}%</td></tr>
+            <tr><td>{top_palmiers.iloc[1,0]}</td><td>{top_palmiers.iloc[1,1]:,}</td><td>{top_palmiers.iloc[1,2]:.1f}%</td></tr>
+            <tr><td>{top_palmiers.iloc[2,0]}</td><td>{top_palmiers.iloc[2,1]:,}</td><td>{top_palmiers.iloc[2,2]:.1f}%</td></tr>
         </table>
     </div>
     """, unsafe_allow_html=True)
@@ -327,33 +355,66 @@ with col_map:
     st.markdown(f"<h2 class='section-title'>🗺️ Carte Interactive</h2>", unsafe_allow_html=True)
     
     # Création de la carte
-    m = folium.Map(location=[34, 9], zoom_start=6, tiles="cartodbpositron")
     style_gouv = {
         'fillColor': COLORS['sky_blue'],
         'color': COLORS['dark_blue'],
         'weight': 2,
         'fillOpacity': 0.3
     }
-    folium.GeoJson(gdf_gouv, name="Gouvernorats", 
-                  style_function=lambda x: style_gouv,
-                  tooltip=folium.GeoJsonTooltip(fields=['gouv_fr'], aliases=["Gouvernorat:"])).add_to(m)
-    folium.LayerControl().add_to(m)
+
+    # Choroplèthe : changer d'indicateur ne fait que recolorer la couche affichée
+    colormap = None
+    restyle_gouv = {}
+    if choropleth:
+        restyle_gouv, colormap = choropleth_styles(
+            indicator_by_gouv(bio_kpis, indicator, name_to_gouv, measure), style_gouv,
+            colors=["#E9F7F1", COLORS['mint_green'], COLORS['dark_blue']],
+            caption=f"{indicator} ({'part du national, %' if measure == 'part' else 'valeur'})"
+        )
+
+    def build_map():
+        m = folium.Map(location=[34, 9], zoom_start=6, tiles="cartodbpositron")
+        if VECTOR_TILES_ENABLED:
+            VectorTileLayer(start_tile_server(), "gouvernorats", style_gouv,
+                            tooltip_fields=['gouv_fr'], tooltip_aliases=["Gouvernorat:"],
+                            name="Gouvernorats").add_to(m)
+        else:
+            folium.GeoJson(gdf_gouv, name="Gouvernorats", 
+                          style_function=lambda x: style_gouv,
+                          tooltip=folium.GeoJsonTooltip(fields=['gouv_fr'], aliases=["Gouvernorat:"])).add_to(m)
+        folium.LayerControl().add_to(m)
+        return m
     
-    # Affichage de la carte
-    map_data = st_folium(
-        m, 
+    # Affichage de la carte (rendu réutilisé tant que la configuration ne change pas)
+    map_data = st_folium_cached(
+        {"vector_tiles": VECTOR_TILES_ENABLED, "style_gouv": style_gouv, "tooltip_gouv": ['gouv_fr'], "data": REGISTRY.version("gouvernorats")},
+        build_map,
         height=700, 
         width="100%", 
-        returned_objects=["last_object_clicked", "last_active_drawing"]
+        returned_objects=["last_object_clicked", "last_active_drawing", "last_clicked"],
+        restyle={"Gouvernorats": ("gouv_id", restyle_gouv, style_gouv)}
     )
-    
+    if colormap is not None:
+        st.markdown(colormap._repr_html_(), unsafe_allow_html=True)
+        st.caption(f"{len(restyle_gouv)} gouvernorats renseignés")
+
+    # Avec les tuiles vectorielles, le gouvernorat est retrouvé à partir des coordonnées
+    # du clic ; dans les deux cas, il est ramené au nom du fichier Excel par la jointure
+    if VECTOR_TILES_ENABLED and map_data and map_data.get("last_clicked"):
+        clicked = find_clicked_gouvernorat(map_data["last_clicked"])
+        if clicked is not None:
+            st.session_state.selected_gouv = gouv_index['gouv_to_name'].get(clicked['gouv_id'], clicked['gouv_fr'])
+            st.success(f"Gouvernorat sélectionné: {clicked['gouv_fr']}")
+        else:
+            st.warning("Veuillez cliquer sur un gouvernorat")
+
     # Gestion du clic sur la carte
-    if map_data and (map_data.get("last_object_clicked") or map_data.get("last_active_drawing")):
+    elif map_data and (map_data.get("last_object_clicked") or map_data.get("last_active_drawing")):
         clicked_data = map_data.get("last_active_drawing") or map_data.get("last_object_clicked")
         try:
-            clicked_gouv = clicked_data["properties"]["gouv_fr"]
-            st.session_state.selected_gouv = clicked_gouv
-            st.success(f"Gouvernorat sélectionné: {clicked_gouv}")
+            properties = clicked_data["properties"]
+            st.session_state.selected_gouv = gouv_index['gouv_to_name'].get(properties["gouv_id"], properties["gouv_fr"])
+            st.success(f"Gouvernorat sélectionné: {properties['gouv_fr']}")
         except (KeyError, TypeError):
             st.warning("Veuillez cliquer sur un gouvernorat")
 
@@ -364,7 +425,7 @@ with col_kpi:
     """, unsafe_allow_html=True)
     
     # Liste des gouvernorats pour la sélection manuelle
-    gouvernorats = sorted(df_bio['GOUVERNORAT'].unique().tolist())
+    gouvernorats = sorted(bio_kpis['table'].index.tolist())
     
     # Sélection du gouvernorat (carte ou menu)
     if "selected_gouv" not in st.session_state:
@@ -378,8 +439,9 @@ with col_kpi:
     st.session_state.selected_gouv = selected_gouv
     
     # Affichage des KPI locaux
-    if st.session_state.selected_gouv in df_bio['GOUVERNORAT'].values:
-        gouv_data = df_bio[df_bio['GOUVERNORAT'] == st.session_state.selected_gouv].iloc[0]
+    if st.session_state.selected_gouv in bio_kpis['table'].index:
+        # Valeur, part du national et rang de chaque indicateur : simple lecture de ligne
+        gouv_kpis = indicator_row(bio_kpis, st.session_state.selected_gouv)
         
         # Layout des KPI
         col_kpi1, col_kpi2 = st.columns(2)
@@ -388,9 +450,9 @@ with col_kpi:
             st.markdown(f"""
             <div class="local-kpi-card">
                 <div class="local-kpi-label">Oliviers</div>
-                <div class="local-kpi-value" style="color:{COLORS['sky_blue']}">{gouv_data['OLIVIER']:,}</div>
+                <div class="local-kpi-value" style="color:{COLORS['sky_blue']}">{as_int(gouv_kpis.loc['OLIVIER', 'valeur'])}</div>
                 <div class="local-kpi-comparison">
-                    {(gouv_data['OLIVIER']/total_oliviers*100):.1f}% du national
+                    {gouv_kpis.loc['OLIVIER', 'part']:.1f}% du national
                 </div>
             </div>
             """, unsafe_allow_html=True)
@@ -398,9 +460,9 @@ with col_kpi:
             st.markdown(f"""
             <div class="local-kpi-card">
                 <div class="local-kpi-label">Surface Arboricole</div>
-                <div class="local-kpi-value" style="color:{COLORS['soft_purple']}">{gouv_data['arboriculture']:,} ha</div>
+                <div class="local-kpi-value" style="color:{COLORS['soft_purple']}">{as_int(gouv_kpis.loc['arboriculture', 'valeur'])} ha</div>
                 <div class="local-kpi-comparison">
-                    {(gouv_data['arboriculture']/surface_arboriculture*100):.1f}% du national
+                    {gouv_kpis.loc['arboriculture', 'part']:.1f}% du national
                 </div>
             </div>
             """, unsafe_allow_html=True)
@@ -409,9 +471,9 @@ with col_kpi:
             st.markdown(f"""
             <div class="local-kpi-card">
                 <div class="local-kpi-label">Palmiers Dattiers</div>
-                <div class="local-kpi-value" style="color:{COLORS['mint_green']}">{gouv_data['PALMIER_DATTIER']:,}</div>
+                <div class="local-kpi-value" style="color:{COLORS['mint_green']}">{as_int(gouv_kpis.loc['PALMIER_DATTIER', 'valeur'])}</div>
                 <div class="local-kpi-comparison">
-                    {(gouv_data['PALMIER_DATTIER']/total_palmiers*100):.1f}% du national
+                    {gouv_kpis.loc['PALMIER_DATTIER', 'part']:.1f}% du national
                 </div>
             </div>
             """, unsafe_allow_html=True)
@@ -419,37 +481,37 @@ with col_kpi:
             st.markdown(f"""
             <div class="local-kpi-card">
                 <div class="local-kpi-label">Surface Forestière</div>
-                <div class="local-kpi-value" style="color:{COLORS['vivid_orange']}">{gouv_data['foret']:,} ha</div>
+                <div class="local-kpi-value" style="color:{COLORS['vivid_orange']}">{as_int(gouv_kpis.loc['foret', 'valeur'])} ha</div>
                 <div class="local-kpi-comparison">
-                    {(gouv_data['foret']/surface_forestiere*100):.1f}% du national
+                    {gouv_kpis.loc['foret', 'part']:.1f}% du national
                 </div>
             </div>
             """, unsafe_allow_html=True)
         
         # Classement national
-        rank_olivier = int(df_bio['OLIVIER'].rank(ascending=False, method='min').loc[df_bio['GOUVERNORAT'] == st.session_state.selected_gouv].values[0])
+        ranked = [("Oliviers", 'OLIVIER'), ("Palmiers", 'PALMIER_DATTIER'), ("Arboriculture", 'arboriculture'), ("Forêt", 'foret')]
+        ranks_html = "".join(f"""
+            <div style="display:inline-block; margin:0 15px;">
+                <div style="font-size:0.8rem;">{label}</div>
+                <div style="font-size:1.5rem; font-weight:700; color:{COLORS['dark_blue']}">#{as_int(gouv_kpis.loc[column, 'rang'])}</div>
+            </div>""" for label, column in ranked)
         
         st.markdown(f"""
         <div class="local-kpi-card" style="text-align:center; background: rgba(26,26,46,0.03);">
             <div style="font-size:0.9rem; color:#555;">Classement National</div>
-            <div style="display:inline-block; margin:0 15px;">
-                <div style="font-size:0.8rem;">Oliviers</div>
-                <div style="font-size:1.5rem; font-weight:700; color:{COLORS['dark_blue']}">#{rank_olivier}</div>
-            </div>
+            {ranks_html}
         </div>
         </div>  <!-- Fermeture du container -->
         """, unsafe_allow_html=True)
         
         # Données détaillées
         st.markdown(f"<h2 class='section-title'>📋 Données Complètes</h2>", unsafe_allow_html=True)
-        st.dataframe(gouv_data.to_frame().T, 
-                    hide_index=True,
+        st.dataframe(gouv_kpis,
                     use_container_width=True,
                     column_config={
-                        "GOUVERNORAT": "Gouvernorat",
-                        "OLIVIER": st.column_config.NumberColumn("Oliviers", format="%d"),
-                        "PALMIER_DATTIER": st.column_config.NumberColumn("Palmiers", format="%d"),
-                        "foret": st.column_config.NumberColumn("Forêt (ha)", format="%d")
+                        "valeur": st.column_config.NumberColumn("Valeur", format="%d"),
+                        "part": st.column_config.NumberColumn("Part du national", format="%.1f %%"),
+                        "rang": st.column_config.NumberColumn("Rang", format="#%d")
                     })
     else:
         st.markdown("""
@@ -457,4 +519,6 @@ with col_kpi:
             Sélectionnez un gouvernorat pour voir les statistiques locales
         </div>
         </div>  <!-- Fermeture du container -->
-        """, unsafe_allow_html=True)
\ No newline at end of file
+        """, unsafe_allow_html=True)
+
+end_rerun()
@@ -0,0 +1,377 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+import streamlit.logger
+# Hors `streamlit run`, les caches avertissent de l'absence de contexte dès leur déclaration
+streamlit.logger.set_log_level("error")
+from scripts.bio_utils import BIO_PATH, BIO_ID, MEASURES, load_bio_data, bio_indicators
+from scripts.data_utils import RAIN_COLUMNS, frame_digest
+from scripts.dashboard import delegation_stations, latest_readings
+from scripts.gazetteer import station_index_for, gouv_index_for
+from scripts.geo_utils import load_geodata, load_spatial_index, locate_points
+from scripts.rain_store import query_rainfall, stored_stations, store_version
+from scripts.registry import REGISTRY
+from scripts.reports import period_totals
+
+# API HTTP locale en lecture (JSON ou CSV) sur les relevés de l'entrepôt, les
+# contours et le classeur bio, pour les clients qui n'ont pas besoin de
+# l'interface. Elle partage les chargeurs et le registre des pages ; les
+# réponses sont gardées en mémoire (LRU bornée en octets) sous une clé qui
+# inclut la version des données, et les tables volumineuses sont envoyées en
+# flux (Transfer-Encoding: chunked) sans être mises en cache.
+#
+#   python -m scripts.api_server
+#   curl 'http://127.0.0.1:8766/rainfall?del_id=TN11A&start=2023-09-01&end=2024-08-31&format=csv'
+API_HOST = os.environ.get("SMARTSDG_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("SMARTSDG_API_PORT", "8766"))
+RESPONSE_CACHE_BYTES = 64 << 20
+# Au-delà, la réponse part en flux au fil de l'encodage et n'est pas gardée
+RESPONSE_MAX_CACHED = 4 << 20
+STREAM_ROWS = 20_000
+FORMATS = {"json": "application/json; charset=utf-8", "csv": "text/csv; charset=utf-8"}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class ResponseCache:
+    """Corps de réponse encodés, évincés du moins récemment servi au-delà de `max_bytes`."""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = body
+            self.nbytes += len(body)
+            while self.nbytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses}
+
+RESPONSES = ResponseCache()
+
+# ---------------------------------------------------------------- paramètres
+
+def _param(params, name, required=False):
+    value = params.get(name, [None])[-1]
+    if required and not value:
+        raise ApiError(400, f"paramètre manquant : {name}")
+    return value or None
+
+def _date(params, name):
+    value = _param(params, name)
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise ApiError(400, f"date invalide pour {name} : {value}")
+
+def _float(params, name):
+    value = _param(params, name, required=True)
+    try:
+        return float(value)
+    except ValueError:
+        raise ApiError(400, f"nombre invalide pour {name} : {value}")
+
+# -------------------------------------------------------------------- données
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+def store_station_index():
+    """Index du gazetteer pour les stations de l'entrepôt, recalculé après chaque écriture."""
+    key = (store_version(), REGISTRY.version("geodata"))
+    with _index_lock:
+        if _index_cache.get("key") != key:
+            _, gdf_del = load_geodata()
+            stations = pd.DataFrame({'station': stored_stations()})
+            _index_cache.update(key=key, index=station_index_for(stations, gdf_del))
+        return _index_cache["index"]
+
+def _delegations():
+    _, gdf_del = load_geodata()
+    return pd.DataFrame(gdf_del.drop(columns="geometry"))
+
+def _area_stations(params):
+    """Stations d'une délégation (del_id) ou d'un gouvernorat (gouv_id)."""
+    delegations = _delegations()
+    del_id, gouv_id = _param(params, "del_id"), _param(params, "gouv_id")
+    if del_id:
+        del_ids = delegations.loc[delegations['del_id'] == del_id, 'del_id']
+    elif gouv_id:
+        del_ids = delegations.loc[delegations['gouv_id'] == gouv_id, 'del_id']
+    else:
+        raise ApiError(400, "paramètre manquant : del_id ou gouv_id")
+    if del_ids.empty:
+        raise ApiError(404, f"zone inconnue : {del_id or gouv_id}")
+    index = store_station_index()
+    return sorted({s for d in del_ids for s in delegation_stations(index, d)})
+
+def _rainfall(params, stations=None):
+    start, end = _date(params, "start"), _date(params, "end")
+    if stations is None:
+        stations = _area_stations(params)
+    df = query_rainfall(start, end, stations=stations) if stations else None
+    return df if df is not None else pd.DataFrame(columns=['Date', 'station', *RAIN_COLUMNS])
+
+# --------------------------------------------------------------------- routes
+
+def route_delegations(params):
+    """Délégations (del_id, noms, gouvernorat), éventuellement d'un seul gouvernorat."""
+    delegations = _delegations()
+    gouv_id = _param(params, "gouv_id")
+    if gouv_id:
+        delegations = delegations[delegations['gouv_id'] == gouv_id]
+    return delegations
+
+def route_locate(params):
+    """Délégation et gouvernorat d'un point (lat, lon), ou de plusieurs : points=lat,lon;lat,lon..."""
+    points = _param(params, "points")
+    if points:
+        try:
+            lats, lons = zip(*(map(float, p.split(",")) for p in points.split(";") if p))
+        except ValueError:
+            raise ApiError(400, "points attendus sous la forme lat,lon;lat,lon")
+        return locate_points(np.array(lons), np.array(lats))
+    lat, lon = _float(params, "lat"), _float(params, "lon")
+    delegation, gouv = load_spatial_index().lookup(lon, lat)
+    if delegation is None and gouv is None:
+        raise ApiError(404, "point hors de Tunisie")
+    found = {"lat": lat, "lon": lon}
+    if delegation is not None:
+        found.update(delegation.drop(labels="geometry", errors="ignore").to_dict())
+    found.update(gouv or {})
+    return found
+
+def route_rainfall(params):
+    """Relevés journaliers des stations d'une délégation ou d'un gouvernorat, entre start et end."""
+    return _rainfall(params)
+
+def route_rainfall_summary(params):
+    """Indicateurs du tableau de bord sur la période : dernier relevé, cumul, jours de pluie, maximum."""
+    stations = _area_stations(params)
+    df = _rainfall(params, stations)
+    summary = {"stations": stations, "relevés": len(df)}
+    if not df.empty:
+        summary.update(period_totals(df))
+        summary["dernier_relevé"] = latest_readings(df).astype('float64').round(1).to_dict()
+        summary["date_dernier_relevé"] = df['Date'].max()
+    return summary
+
+def route_indicators(params):
+    """Indicateurs bio par gouvernorat (valeur, part, rang), filtrables par gouv_id et indicator."""
+    df_bio = load_bio_data(BIO_PATH)
+    indicators = bio_indicators(frame_digest(df_bio), df_bio)
+    name_to_gouv = gouv_index_for(df_bio[BIO_ID].dropna().unique(), load_geodata()[1])['name_to_gouv']
+
+    table = indicators["table"]
+    indicator = _param(params, "indicator")
+    if indicator is not None and indicator not in indicators["indicators"]:
+        raise ApiError(404, f"indicateur inconnu : {indicator}")
+    long = table.stack(level=1, future_stack=True)[MEASURES].rename_axis([BIO_ID, "indicateur"]).reset_index()
+    long.insert(1, "gouv_id", long[BIO_ID].map(name_to_gouv))
+    if indicator is not None:
+        long = long[long["indicateur"] == indicator]
+    gouv_id = _param(params, "gouv_id")
+    if gouv_id is not None:
+        long = long[long["gouv_id"] == gouv_id]
+    return long
+
+def route_health(params):
+    return {"status": "ok", "versions": data_versions(), "cache": RESPONSES.stats()}
+
+ROUTES = {
+    "/delegations": route_delegations,
+    "/locate": route_locate,
+    "/rainfall": route_rainfall,
+    "/rainfall/summary": route_rainfall_summary,
+    "/indicators": route_indicators,
+    "/health": route_health,
+}
+# Réponses jamais mises en cache
+UNCACHED = {"/health"}
+
+def data_versions():
+    """Version de chaque source : une écriture ou un rechargement change la clé des réponses."""
+    return {
+        "store": store_version(),
+        "geodata": REGISTRY.version("geodata"),
+        "bio": REGISTRY.version(f"bio:{BIO_PATH}"),
+    }
+
+# ------------------------------------------------------------------- encodage
+
+def _plain(chunk):
+    """Dates en AAAA-MM-JJ et float32 ramenés à leur valeur décimale pour le JSON."""
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        dtype = chunk[column].dtype
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            chunk[column] = chunk[column].dt.strftime('%Y-%m-%d')
+        elif dtype == 'float32':
+            chunk[column] = chunk[column].astype('float64').round(4)
+    return chunk
+
+def _json_ready(value):
+    """Valeurs natives pour json.dumps : scalaires numpy via .item(), NaN/NA en null, dates AAAA-MM-JJ."""
+    if isinstance(value, dict):
+        return {key: _json_ready(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_json_ready(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d') if value == value.normalize() else value.isoformat()
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and not np.isfinite(value) or pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    return value
+
+def encode(result, fmt):
+    """Corps de la réponse, par morceaux : une table est encodée par tranches de STREAM_ROWS lignes."""
+    if not isinstance(result, pd.DataFrame):
+        if fmt == "csv":
+            result = pd.DataFrame([result])
+        else:
+            yield json.dumps(_json_ready(result), ensure_ascii=False, allow_nan=False, default=str).encode("utf-8")
+            return
+    if fmt == "csv":
+        for start in range(0, max(len(result), 1), STREAM_ROWS):
+            chunk = result.iloc[start:start + STREAM_ROWS]
+            yield chunk.to_csv(index=False, header=start == 0, date_format='%Y-%m-%d').encode("utf-8")
+        return
+    yield b"["
+    for start in range(0, len(result), STREAM_ROWS):
+        records = _plain(result.iloc[start:start + STREAM_ROWS]).to_json(orient="records", force_ascii=False)
+        yield ("," if start else "").encode("utf-8") + records[1:-1].encode("utf-8")
+    yield b"]"
+
+def cache_key(path, params, fmt):
+    query = json.dumps(sorted((k, v) for k, v in params.items() if k != "format"))
+    versions = json.dumps(data_versions(), sort_keys=True)
+    return hashlib.sha256(f"{path}|{query}|{fmt}|{versions}".encode("utf-8")).hexdigest()[:32]
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # Connexions persistantes : un client enchaîne ses requêtes sur la même socket ;
+    # sans Nagle, le corps écrit après les en-têtes part sans attendre l'accusé de réception
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/") or "/"
+        route = ROUTES.get(path)
+        if route is None:
+            self._send_json(404, {"error": f"route inconnue : {path}", "routes": sorted(ROUTES)})
+            return
+        params = parse_qs(url.query)
+        fmt = _param(params, "format") or "json"
+        if fmt not in FORMATS:
+            self._send_json(400, {"error": f"format inconnu : {fmt}"})
+            return
+
+        try:
+            key = None if path in UNCACHED else cache_key(path, params, fmt)
+            etag = f'"{key}"'
+            if key is not None and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            body = RESPONSES.get(key) if key is not None else None
+            if body is None:
+                chunks = encode(route(params), fmt)
+                body = self._buffer(chunks)
+                if body is None:
+                    self._stream(chunks, fmt, etag)
+                    return
+                if key is not None:
+                    RESPONSES.put(key, body)
+        except ApiError as e:
+            self._send_json(e.status, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._send(200, FORMATS[fmt], body, etag if key is not None else None)
+
+    def _buffer(self, chunks):
+        """Corps complet s'il tient dans RESPONSE_MAX_CACHED, sinon None (`chunks` reprend où il en est)."""
+        self._pending = []
+        size = 0
+        for chunk in chunks:
+            self._pending.append(chunk)
+            size += len(chunk)
+            if size > RESPONSE_MAX_CACHED:
+                return None
+        return b"".join(self._pending)
+
+    def _stream(self, chunks, fmt, etag):
+        self.send_response(200)
+        self.send_header("Content-Type", FORMATS[fmt])
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        for chunk in (*self._pending, *chunks):
+            if chunk:
+                self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send(self, status, content_type, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, FORMATS["json"], json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+def make_server(host=API_HOST, port=API_PORT):
+    """Serveur prêt à servir : contours, index spatial et classeur bio chargés d'avance."""
+    load_geodata()
+    load_spatial_index()
+    load_bio_data(BIO_PATH)
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    return server
+
+if __name__ == "__main__":
+    server = make_server()
+    print(f"API servie sur http://{API_HOST}:{API_PORT} : {', '.join(sorted(ROUTES))}")
+    server.serve_forever()
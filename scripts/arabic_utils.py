@@ -1,3 +1,5 @@
+import re
+import unicodedata
 from arabic_reshaper import reshape
 from bidi.algorithm import get_display
 
@@ -6,3 +8,20 @@ def normalize_arabic(text):
         return get_display(reshape(text.strip())) if isinstance(text, str) else text
     except:
         return text
+
+# Harakat, shadda, sukun, alef suscrit et tatweel : ignorés pour la comparaison
+_DIACRITICS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+_LETTERS = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ی": "ي",
+    "ة": "ه",
+})
+_SEPARATORS = re.compile(r"[\s\-_.,'\"()/]+")
+
+def normalize_key(text):
+    """Forme canonique d'un nom arabe pour la recherche (et non pour l'affichage)."""
+    if not isinstance(text, str):
+        return ""
+    text = _DIACRITICS.sub("", unicodedata.normalize("NFKC", text))
+    text = text.translate(_LETTERS)
+    return _SEPARATORS.sub(" ", text).strip()
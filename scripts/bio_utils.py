@@ -0,0 +1,62 @@
+import pandas as pd
+from scripts.registry import shared
+from scripts.tracing import traced, cache_miss
+
+BIO_PATH = "data/repartition_bio.xlsx"
+BIO_ID = "GOUVERNORAT"
+MEASURES = ["valeur", "part", "rang"]
+# Jeux d'indicateurs gardés en mémoire (un par contenu de classeur)
+BIO_INDICATORS_MAX_ENTRIES = 4
+
+@traced("load_bio_data", cache=True)
+def load_bio_data(file_path):
+    """Classeur bio, lu une fois par processus (vue partagée en lecture seule)."""
+    return shared(f"bio:{file_path}", cache_miss(lambda: pd.read_excel(file_path)), sources=[file_path])
+
+@traced("bio_indicators", cache=True)
+def bio_indicators(key, _df, id_column=BIO_ID):
+    """Totaux, parts et rangs de chaque colonne numérique de `_df`, calculés en une passe.
+
+    `table` est indexée par gouvernorat, avec des colonnes (mesure, indicateur) :
+    valeur, part (% du total national) et rang (1 = premier, ex aequo au même
+    rang). Toute nouvelle colonne numérique du fichier y apparaît d'elle-même.
+    Le résultat est partagé par toutes les sessions (une entrée par `key`,
+    au plus BIO_INDICATORS_MAX_ENTRIES).
+    """
+    return shared(f"bio_indicators:{key}:{id_column}", cache_miss(lambda: _indicators(_df, id_column)),
+                  family="bio_indicators", max_entries=BIO_INDICATORS_MAX_ENTRIES)
+
+def _indicators(_df, id_column):
+    values = _df.set_index(id_column).select_dtypes("number")
+    totals = values.sum()
+    shares = values.div(totals.where(totals != 0)).mul(100)
+    # Int64 (entier nullable) : un gouvernorat sans valeur reste sans rang
+    ranks = values.rank(ascending=False, method="min").astype("Int64")
+    return {
+        "table": pd.concat({"valeur": values, "part": shares, "rang": ranks}, axis=1),
+        "totals": totals,
+        "active": (values > 0).sum(),
+        "indicators": tuple(values.columns),
+    }
+
+def top_n(indicators, column, n=3):
+    """Les `n` premiers gouvernorats pour `column` : valeur et part du national."""
+    table = indicators["table"]
+    order = table[("rang", column)].sort_values(kind="stable").index[:n]
+    top = table.loc[order, [("valeur", column), ("part", column)]]
+    top.columns = ["valeur", "part"]
+    return top.rename_axis(BIO_ID).reset_index()
+
+def indicator_row(indicators, gouvernorat):
+    """Valeur, part et rang de chaque indicateur pour un gouvernorat (simple lecture de ligne)."""
+    return indicators["table"].loc[gouvernorat].unstack(0)[MEASURES]
+
+def as_int(value):
+    """Entier à afficher (séparateur de milliers), « — » pour une valeur ou un rang absent."""
+    return "—" if pd.isna(value) else f"{int(value):,}"
+
+def indicator_by_gouv(indicators, column, name_to_gouv, measure="valeur"):
+    """Mesure d'un indicateur indexée par gouv_id (gouvernorats non joints écartés)."""
+    values = indicators["table"][(measure, column)]
+    values = values.rename(index=name_to_gouv)
+    return values[values.index.isin(name_to_gouv.values())]
@@ -0,0 +1,9 @@
+from scripts.geo_utils import GOUV_PATH, DEL_PATH, compile_geodata, compile_lod
+
+# Compilation des fonds de carte en GeoParquet, à lancer après chaque mise à jour des GeoJSON :
+#   python -m scripts.build_geodata
+if __name__ == "__main__":
+    for path in (GOUV_PATH, DEL_PATH):
+        print(f"{path} -> {compile_geodata(path)}")
+        for target in compile_lod(path):
+            print(f"{path} -> {target}")
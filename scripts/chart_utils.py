@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import streamlit as st
+
+# Nombre maximal de points envoyés au navigateur par graphique (~ 2 points par pixel
+# d'un graphique de 700 px) ; modifiable avec SMARTSDG_CHART_POINTS
+CHART_MAX_POINTS = int(os.environ.get("SMARTSDG_CHART_POINTS", "1400"))
+# Part du budget réservée aux plus fortes valeurs, toujours conservées
+PEAK_SHARE = 0.05
+
+def lttb_indices(x, y, n_out):
+    """Indices retenus par Largest-Triangle-Three-Buckets (premier et dernier points inclus).
+
+    Dans chaque seau, on garde le point qui forme le plus grand triangle avec
+    le point retenu au seau précédent et la moyenne du seau suivant.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Moyennes de chaque seau, calculées d'un coup avec des sommes cumulées
+    cx, cy = np.concatenate([[0], np.cumsum(x)]), np.concatenate([[0], np.cumsum(y)])
+    sizes = edges[1:] - edges[:-1]
+    mean_x = (cx[edges[1:]] - cx[edges[:-1]]) / sizes
+    mean_y = (cy[edges[1:]] - cy[edges[:-1]]) / sizes
+    mean_x, mean_y = np.append(mean_x, x[-1]), np.append(mean_y, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax_indices(y, n_out):
+    """Indices du minimum et du maximum de chaque seau (n_out // 2 seaux de taille égale)."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    buckets = np.arange(n) * max(n_out // 2, 1) // n
+    order = np.lexsort((y, buckets))
+    starts = np.flatnonzero(np.r_[True, buckets[order][1:] != buckets[order][:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+def peak_indices(y, n_peaks):
+    """Indices des `n_peaks` plus fortes valeurs."""
+    if n_peaks <= 0 or len(y) == 0:
+        return np.array([], dtype=np.int64)
+    n_peaks = min(n_peaks, len(y))
+    return np.argpartition(-y, n_peaks - 1)[:n_peaks]
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def downsample(key, _df, kind, max_points=CHART_MAX_POINTS, x='Date', y='Pluvio_du_jour', by='station'):
+    """Réduit chaque série de `_df` (une par station) pour un graphique `kind` ("line" ou "bar").
+
+    `key` identifie le contenu de `_df` (stations et période). Le budget de
+    points est partagé entre les stations ; les jours les plus pluvieux sont
+    toujours conservés, en plus des points choisis par LTTB ou min/max.
+    """
+    if len(_df) <= max_points:
+        return _df
+    groups = _df.groupby(by, observed=True, sort=False).indices if by in _df else {None: np.arange(len(_df))}
+    budget = max(max_points // max(len(groups), 1), 10)
+    n_peaks = int(budget * PEAK_SHARE)
+
+    keep = []
+    for rows in groups.values():
+        rows = rows[np.argsort(_df[x].to_numpy()[rows], kind="stable")]
+        values = np.nan_to_num(_df[y].to_numpy(dtype="float64", na_value=np.nan)[rows])
+        if kind == "bar":
+            picked = minmax_indices(values, budget - n_peaks)
+        else:
+            times = _df[x].to_numpy()[rows].astype("datetime64[s]").astype("float64")
+            picked = lttb_indices(times, values, budget - n_peaks)
+        keep.append(rows[np.union1d(picked, peak_indices(values, n_peaks))])
+    return _df.iloc[np.sort(np.concatenate(keep))]
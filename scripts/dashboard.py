@@ -1,8 +1,138 @@
+import numpy as np
+import pandas as pd
 import streamlit as st
 import plotly.express as px
-from scripts.arabic_utils import normalize_arabic
+from scripts.data_utils import data_key, tag_frame
+from scripts.chart_utils import CHART_MAX_POINTS, downsample
+from scripts.tracing import span, traced
 
-def show_dashboard(properties, df, graph_type):
+# Budget de cellules de la carte thermique (~ pixels affichés) : au-delà,
+# les jours sont regroupés par semaines et les stations par paquets
+HEATMAP_MAX_COLS = 800
+HEATMAP_MAX_ROWS = 300
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def rain_matrix(key, _df, max_rows=HEATMAP_MAX_ROWS, max_cols=HEATMAP_MAX_COLS):
+    """Matrice station × jour (ou × semaine) de la pluie journalière, sans boucle Python.
+
+    Chaque relevé est placé par son indice (station, colonne) puis cumulé avec
+    np.bincount. Si la période dépasse `max_cols` jours, les colonnes deviennent
+    des cumuls sur 7·k jours ; au-delà de `max_rows` stations, les lignes sont
+    moyennées par paquets de stations voisines.
+    """
+    stations = _df['station'].astype('category').cat.remove_unused_categories()
+    names = stations.cat.categories.astype(str)
+    codes = stations.cat.codes.to_numpy().astype('int64')
+    rain = _df['Pluvio_du_jour'].to_numpy(dtype='float64', na_value=np.nan)
+    dates = _df['Date'].dt.normalize()
+
+    start = dates.min()
+    n_days = (dates.max() - start).days + 1
+    step = 1
+    if n_days > max_cols:
+        # Semaines complètes, alignées sur le lundi
+        start -= pd.Timedelta(days=start.dayofweek)
+        n_days = (dates.max() - start).days + 1
+        step = 7 * int(np.ceil(n_days / (7 * max_cols)))
+    days = ((dates - start) // pd.Timedelta(days=1)).to_numpy()
+    n_cols = (n_days - 1) // step + 1
+
+    valid = ~np.isnan(rain)
+    flat = codes * n_cols + days // step
+    size = len(names) * n_cols
+    total = np.bincount(flat[valid], weights=rain[valid], minlength=size).reshape(len(names), n_cols)
+    count = np.bincount(flat[valid], minlength=size).reshape(len(names), n_cols)
+
+    labels = list(names)
+    row_step = int(np.ceil(len(names) / max_rows)) if len(names) > max_rows else 1
+    if row_step > 1:
+        # Moyenne des stations présentes dans chaque paquet
+        has_data = count > 0
+        pad = (-len(names)) % row_step
+        total = np.pad(total, ((0, pad), (0, 0))).reshape(-1, row_step, n_cols).sum(axis=1)
+        count = np.pad(has_data, ((0, pad), (0, 0))).reshape(-1, row_step, n_cols).sum(axis=1)
+        labels = [f"{names[i]} … {names[min(i + row_step, len(names)) - 1]}" for i in range(0, len(names), row_step)]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        matrix = np.where(count > 0, total / np.maximum(count, 1) if row_step > 1 else total, np.nan)
+    return {
+        'matrix': matrix.astype('float32'),
+        'stations': labels,
+        'dates': pd.date_range(start, periods=n_cols, freq=f"{step}D"),
+        'step': step,
+        'row_step': row_step,
+    }
+
+def heatmap_figure(df, title):
+    """Carte thermique station × date de la pluie journalière (ou cumulée par semaine)."""
+    heat = rain_matrix(data_key(df), df)
+    unit = "Pluie (mm)" if heat['step'] == 1 else f"Cumul {heat['step']} j (mm)"
+    fig = px.imshow(
+        heat['matrix'],
+        x=heat['dates'],
+        y=heat['stations'],
+        aspect='auto',
+        color_continuous_scale="Blues",
+        labels=dict(x="Date", y="Station", color=unit),
+        title=title,
+        template="plotly_white"
+    )
+    fig.update_layout(height=max(300, min(900, 18 * len(heat['stations']) + 150)))
+    return fig
+
+# Calculs du tableau de bord, sans Streamlit : réutilisés par la page et par
+# les rapports en lot (scripts/reports.py)
+def delegation_stations(station_index, del_id):
+    """Stations rattachées à une délégation par le gazetteer."""
+    if station_index is None:
+        return []
+    return station_index['del_to_stations'].get(del_id, [])
+
+def latest_readings(station_data):
+    """Dernier relevé de chaque station (données triées par station puis Date), moyenné sur les stations."""
+    return station_data.groupby('station', observed=True).tail(1)[['Pluvio_du_jour', 'Cumul_du_mois', 'Cumul_periode']].mean().round(1)
+
+def rainfall_figure(station_data, graph_type, place, several, max_points=CHART_MAX_POINTS):
+    """Graphique de la pluviométrie de `station_data` : "Courbe", "Barres" ou "Carte thermique"."""
+    # Séries réduites côté serveur (LTTB / min-max) : une trace par station
+    if graph_type == "Courbe":
+        fig = px.line(
+            downsample(data_key(station_data), station_data, "line", max_points),
+            x='Date', 
+            y='Pluvio_du_jour',
+            color='station' if several else None,
+            title=f"Évolution de la pluviométrie à {place}",
+            color_discrete_sequence=["#1E90FF"] if not several else None,
+            template="plotly_white"
+        )
+    elif graph_type == "Barres":
+        fig = px.bar(
+            downsample(data_key(station_data), station_data, "bar", max_points),
+            x='Date', 
+            y='Pluvio_du_jour',
+            color='station' if several else None,
+            title=f"Pluviométrie journalière à {place}",
+            color_discrete_sequence=["#3bdb6e"] if not several else None,
+            template="plotly_white"
+        )
+    elif graph_type == "Carte thermique":
+        fig = heatmap_figure(station_data, f"Pluviométrie journalière par station à {place}")
+
+    # Personnalisation du graphique
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis_title="Date",
+        yaxis_title="Pluviométrie (mm)",
+        hovermode="x unified",
+        font=dict(family="sans serif", size=12)
+    )
+    if graph_type == "Carte thermique":
+        fig.update_layout(yaxis_title="Station", hovermode="closest")
+    return fig
+
+@traced()
+def show_dashboard(properties, df, graph_type, station_index=None, max_points=CHART_MAX_POINTS):
     # Style CSS additionnel pour le dashboard
     st.markdown("""
         <style>
@@ -36,25 +166,23 @@ def show_dashboard(properties, df, graph_type):
         </div>
     """, unsafe_allow_html=True)
     
-    # Normalisation et recherche des stations
-    normalized_del = normalize_arabic(del_ar)
-    matching_stations = [
-        station for station in df['station'].unique()
-        if normalize_arabic(station) == normalized_del
-    ]
+    # Stations rattachées à la délégation (index construit au chargement du fichier)
+    matching_stations = delegation_stations(station_index, properties.get('del_id'))
     
     if not matching_stations:
         st.error(f"⚠️ Aucune station ne correspond à {del_ar}")
         return
     
-    station_data = df[df['station'].isin(matching_stations)]
+    station_data = tag_frame(df[df['station'].isin(matching_stations)], data_key(df), tuple(matching_stations))
     
     if station_data.empty:
         st.warning("⚠️ Données pluviométriques non disponibles pour cette station")
         return
     
-    # Metrics avec style amélioré
-    latest = station_data.iloc[-1]
+    # Dernier relevé de chaque station, moyenné sur les stations de la délégation
+    latest = latest_readings(station_data)
+    if 'Cumul_incoherent' in station_data and station_data['Cumul_incoherent'].any():
+        st.warning(f"⚠️ {int(station_data['Cumul_incoherent'].sum())} relevé(s) dont les cumuls du fichier ont été corrigés")
     cols = st.columns(3)
     with cols[0]:
         st.markdown(f"""
@@ -84,36 +212,11 @@ def show_dashboard(properties, df, graph_type):
     st.markdown("---")
     st.markdown("### 📈 Visualisation des données")
     
-    if graph_type == "Courbe":
-        fig = px.line(
-            station_data, 
-            x='Date', 
-            y='Pluvio_du_jour',
-            title=f"Évolution de la pluviométrie à {del_fr}",
-            color_discrete_sequence=["#1E90FF"],
-            template="plotly_white"
-        )
-    elif graph_type == "Barres":
-        fig = px.bar(
-            station_data, 
-            x='Date', 
-            y='Pluvio_du_jour',
-            title=f"Pluviométrie journalière à {del_fr}",
-            color_discrete_sequence=["#3bdb6e"],
-            template="plotly_white"
-        )
-    
-    # Personnalisation du graphique
-    fig.update_layout(
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        xaxis_title="Date",
-        yaxis_title="Pluviométrie (mm)",
-        hovermode="x unified",
-        font=dict(family="sans serif", size=12)
-    )
+    with span("show_dashboard.graphique"):
+        fig = rainfall_figure(station_data, graph_type, del_fr, len(matching_stations) > 1, max_points)
     
-    st.plotly_chart(fig, use_container_width=True)
+    with span("show_dashboard.envoi"):
+        st.plotly_chart(fig, use_container_width=True)
     
     # Tableau de données avec style
     st.markdown("---")
@@ -127,6 +230,56 @@ def show_dashboard(properties, df, graph_type):
             "Date": st.column_config.DatetimeColumn("Date", format="DD/MM/YYYY"),
             "Pluvio_du_jour": st.column_config.NumberColumn("Pluie (mm)", format="%.1f"),
             "Cumul_du_mois": st.column_config.NumberColumn("Cumul mois (mm)", format="%.1f"),
-            "Cumul_periode": st.column_config.NumberColumn("Cumul période (mm)", format="%.1f")
+            "Cumul_periode": st.column_config.NumberColumn("Cumul période (mm)", format="%.1f"),
+            "Cumul_incoherent": st.column_config.CheckboxColumn("Cumul corrigé")
         }
-    )
\ No newline at end of file
+    )
+
+@traced()
+def show_summary(cube, station_counts, gouv_names, gouv_id=None):
+    """Synthèse nationale (par gouvernorat) ou régionale (par mois), lue dans le cube d'agrégats."""
+    if not cube or ('gouvernorat', 'annee_hydro') not in cube:
+        return
+
+    title, fig = summary_figure(cube, station_counts, gouv_names, gouv_id)
+    st.markdown("---")
+    st.markdown(title)
+    st.plotly_chart(fig, use_container_width=True)
+
+def summary_figure(cube, station_counts, gouv_names, gouv_id=None):
+    """Titre et graphique de la synthèse de la dernière année hydrologique du cube."""
+    yearly = cube[('gouvernorat', 'annee_hydro')]
+    year = int(yearly['annee_hydro'].max())
+
+    if gouv_id is None:
+        title = f"### 🇹🇳 Synthèse nationale — année hydrologique {year}/{year + 1}"
+        data = yearly[yearly['annee_hydro'] == year].copy()
+        data['Gouvernorat'] = data['gouv_id'].map(gouv_names)
+        data['Cumul moyen (mm)'] = data['total'] / data['gouv_id'].map(station_counts)
+        fig = px.bar(
+            data.sort_values('Cumul moyen (mm)', ascending=False),
+            x='Gouvernorat',
+            y='Cumul moyen (mm)',
+            color_discrete_sequence=["#6495ED"],
+            template="plotly_white"
+        )
+    else:
+        title = f"### 📍 {gouv_names.get(gouv_id, gouv_id)} — année hydrologique {year}/{year + 1}"
+        monthly = cube[('gouvernorat', 'mois')]
+        data = monthly[(monthly['gouv_id'] == gouv_id) & (monthly['mois'] >= f"{year}-09-01")].copy()
+        data['Cumul moyen (mm)'] = data['total'] / station_counts.get(gouv_id, 1)
+        fig = px.bar(
+            data,
+            x='mois',
+            y='Cumul moyen (mm)',
+            color_discrete_sequence=["#3bdb6e"],
+            template="plotly_white"
+        )
+
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis_title=None,
+        font=dict(family="sans serif", size=12)
+    )
+    return title, fig
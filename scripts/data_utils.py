@@ -1,11 +1,160 @@
+import hashlib
+import io
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import streamlit as st
+from scripts.tracing import traced, cache_miss
 
-def load_pluviometry(uploaded_file):
+RAIN_COLUMNS = ['Pluvio_du_jour', 'Cumul_du_mois', 'Cumul_periode']
+CUMUL_COLUMNS = ['Cumul_du_mois', 'Cumul_periode']
+# Écart toléré (mm) entre un cumul du fichier et le cumul recalculé
+CUMUL_TOLERANCE = 0.05
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y"]
+CSV_BLOCK_SIZE = 4 << 20
+
+COLUMN_TYPES = {
+    'Date': pa.timestamp('ns'),
+    'station': pa.string(),
+    **{col: pa.float32() for col in RAIN_COLUMNS},
+}
+
+@st.cache_data(show_spinner=False, max_entries=4)
+@cache_miss
+def parse_pluviometry(digest, _data, derive=True):
+    """Parse un CSV pluviométrique (une seule fois par contenu, identifié par `digest`).
+
+    Lecture en flux par blocs avec le lecteur CSV d'Arrow, types imposés :
+    Date au format fixe, pluies en float32, station en catégorie. Avec
+    `derive`, les lignes sont triées et les cumuls recalculés (derive_cumuls).
+    """
+    reader = pacsv.open_csv(
+        io.BytesIO(_data),
+        read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        convert_options=pacsv.ConvertOptions(column_types=COLUMN_TYPES, timestamp_parsers=DATE_FORMATS),
+    )
+    table = pa.Table.from_batches(list(reader), schema=reader.schema)
+
+    station = pc.utf8_trim_whitespace(table['station']).dictionary_encode()
+    table = table.set_column(table.schema.get_field_index('station'), 'station', station)
+    df = table.to_pandas()
+    return derive_cumuls(df) if derive else df
+
+def frame_digest(df):
+    """Empreinte du contenu d'un DataFrame, pour les caches prenant `_df` en argument."""
+    hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(hashed.tobytes()).hexdigest()
+
+def tag_frame(df, *origin):
+    """Associe à `df` une clé de cache calculée sur son origine (fichier, version, période, stations...)."""
+    df.attrs['data_key'] = (hashlib.sha256(repr(origin).encode("utf-8")).hexdigest(), id(df), len(df))
+    return df
+
+def data_key(df):
+    """Clé de cache de `df` : celle posée par tag_frame, sinon l'empreinte de son contenu.
+
+    Une table dérivée (filtre, tri) hérite des attrs de sa source : la clé
+    n'est donc valable que pour l'objet (et la longueur) qui l'a reçue.
+    """
+    key = df.attrs.get('data_key')
+    if key is not None and key[1:] == (id(df), len(df)):
+        return key[0]
+    return frame_digest(df)
+
+@traced("load_pluviometry", cache=True)
+def load_pluviometry(uploaded_file, derive=True):
     try:
-        df = pd.read_csv(uploaded_file, parse_dates=['Date'])
-        df['station'] = df['station'].str.strip()
-        return df
+        data = uploaded_file.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        df = parse_pluviometry(digest, data, derive)
+        df.attrs['source_digest'] = digest
+        return tag_frame(df, "import", digest, derive)
     except Exception as e:
         st.error(f"Erreur lors du chargement du fichier: {e}")
         return None
+
+# L'année hydrologique commence le 1er septembre : 2023 = sept. 2023 -> août 2024
+HYDRO_YEAR_START_MONTH = 9
+SEASONS = {12: 'Hiver', 1: 'Hiver', 2: 'Hiver',
+           3: 'Printemps', 4: 'Printemps', 5: 'Printemps',
+           6: 'Été', 7: 'Été', 8: 'Été',
+           9: 'Automne', 10: 'Automne', 11: 'Automne'}
+
+def hydro_year(dates):
+    return (dates.dt.year - (dates.dt.month < HYDRO_YEAR_START_MONTH)).astype('int32')
+
+def season(dates):
+    return dates.dt.month.map(SEASONS)
+
+def period_starts(dates):
+    """Premier jour du mois et de l'année hydrologique de chaque date."""
+    months = dates.to_numpy().astype('datetime64[M]')
+    years = hydro_year(dates).to_numpy().astype('int64')
+    hydro = ((years - 1970) * 12 + HYDRO_YEAR_START_MONTH - 1).astype('datetime64[M]')
+    return months.astype('datetime64[ns]'), hydro.astype('datetime64[ns]')
+
+def running_cumuls(df, since=None, seed=False):
+    """Cumul_du_mois et Cumul_periode (depuis le 1er septembre) recalculés par station.
+
+    `df` doit être trié par station puis Date. Si `since` (masque booléen) est
+    fourni, seules ces lignes sont recalculées : elles repartent du dernier
+    cumul connu avant elles dans le même mois / la même année hydrologique.
+    Avec `seed`, un mois / une année hydrologique que `df` commence après son
+    premier jour repart du premier cumul fourni (les jours précédents manquent).
+    """
+    rain = df['Pluvio_du_jour'].astype('float64').fillna(0)
+    station = df['station']
+    month_start, hydro_start = period_starts(df['Date'])
+    cumuls = {}
+    for column, period, start in (('Cumul_du_mois', df['Date'].dt.to_period('M'), month_start),
+                                  ('Cumul_periode', hydro_year(df['Date']), hydro_start)):
+        keys = [station, period]
+        if since is None:
+            cumuls[column] = rain.groupby(keys, observed=True).cumsum()
+            if seed:
+                cumuls[column] += _seed(df, column, cumuls[column], start)
+        else:
+            offset = df[column].where(~since).groupby(keys, observed=True).transform('last').fillna(0)
+            cumuls[column] = df[column].where(~since, offset + rain.where(since, 0).groupby(keys, observed=True).cumsum())
+    return pd.DataFrame(cumuls).astype('float32')
+
+def _seed(df, column, running, start):
+    """Cumul antérieur au fichier des mois / années qu'il commence en cours de route :
+    premier cumul fourni moins la pluie cumulée jusqu'à lui (0 ailleurs)."""
+    # Lignes triées par station puis Date : chaque groupe commence là où la
+    # station ou le début de période (`start`) change
+    station = df['station'].to_numpy()
+    first = np.ones(len(df), dtype=bool)
+    first[1:] = (station[1:] != station[:-1]) | (start[1:] != start[:-1])
+    group = np.cumsum(first) - 1
+    truncated = (df['Date'].to_numpy() > start)[first][group]
+    offset = np.zeros(len(df))
+    if truncated.any():
+        before = (df[column].astype('float64') - running)[truncated]
+        offset[truncated] = before.groupby(group[truncated]).transform('first').fillna(0).to_numpy()
+    return offset
+
+def cumul_mismatch(df, computed):
+    """Lignes dont un cumul fourni (non vide) s'écarte du cumul recalculé."""
+    mismatch = np.zeros(len(df), dtype=bool)
+    for column in CUMUL_COLUMNS:
+        if column in df:
+            given = df[column].to_numpy(dtype='float64', na_value=np.nan)
+            mismatch |= np.abs(given - computed[column].to_numpy()) > CUMUL_TOLERANCE
+    return mismatch
+
+def derive_cumuls(df):
+    """Trie par (station, Date) et recalcule les cumuls de toutes les stations en une passe.
+
+    Un fichier qui commence en cours de mois ou d'année hydrologique garde
+    son premier cumul comme point de départ. Seules les lignes dont les cumuls
+    s'écartent de la pluie journalière sont corrigées, et `Cumul_incoherent`
+    les marque.
+    """
+    df = df.sort_values(['station', 'Date'], ignore_index=True)
+    computed = running_cumuls(df, seed=True)
+    df['Cumul_incoherent'] = cumul_mismatch(df, computed)
+    df[CUMUL_COLUMNS] = computed
+    return df
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import ssl
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+
+# Cache disque des fichiers téléchargés depuis catalog.agridata.tn (Excel, GeoJSON) :
+#   - frais pendant DOWNLOAD_TTL secondes : aucun accès réseau ;
+#   - ensuite, servi tel quel pendant DOWNLOAD_STALE secondes de plus et revalidé
+#     en arrière-plan (If-None-Match / If-Modified-Since) ;
+#   - au-delà, revalidé avant d'être servi, la copie périmée restant utilisée si
+#     le catalogue ne répond pas.
+# SMARTSDG_MIRROR_DIR : répertoire local consulté en premier (fichiers nommés comme
+# la fin de l'URL), SMARTSDG_CATALOG_URL : autre adresse du catalogue (serveur de test).
+DOWNLOAD_CACHE_DIR = os.environ.get("SMARTSDG_DOWNLOAD_CACHE", "data/cache/downloads")
+DOWNLOAD_TTL = int(os.environ.get("SMARTSDG_DOWNLOAD_TTL", str(24 * 3600)))
+DOWNLOAD_STALE = int(os.environ.get("SMARTSDG_DOWNLOAD_STALE", str(30 * 24 * 3600)))
+DOWNLOAD_TIMEOUT = 30
+MIRROR_DIR = os.environ.get("SMARTSDG_MIRROR_DIR")
+CATALOG_ORIGIN = "https://catalog.agridata.tn"
+CATALOG_URL = os.environ.get("SMARTSDG_CATALOG_URL", CATALOG_ORIGIN).rstrip("/")
+
+# Hôtes dont le certificat n'est pas vérifiable (chaîne incomplète côté serveur) ;
+# la vérification reste active pour tous les autres
+INSECURE_HOSTS = {"catalog.agridata.tn"}
+
+_locks = {}
+_locks_guard = threading.Lock()
+_refreshing = set()
+
+def _lock_for(url):
+    with _locks_guard:
+        return _locks.setdefault(url, threading.Lock())
+
+def ssl_context(url):
+    """Contexte SSL propre à la requête (sans modifier le contexte global de Python)."""
+    context = ssl.create_default_context()
+    if urlsplit(url).hostname in INSECURE_HOSTS and os.environ.get("SMARTSDG_VERIFY_SSL") != "1":
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+def resolve_url(url):
+    if url.startswith(CATALOG_ORIGIN):
+        return CATALOG_URL + url[len(CATALOG_ORIGIN):]
+    return url
+
+def cache_paths(url):
+    key = hashlib.sha256(url.encode()).hexdigest()[:16]
+    name = os.path.basename(urlsplit(url).path) or "index"
+    base = os.path.join(DOWNLOAD_CACHE_DIR, f"{key}-{name}")
+    return base, f"{base}.json"
+
+def read_meta(url):
+    _, meta_path = cache_paths(url)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+def _write_meta(url, meta):
+    _, meta_path = cache_paths(url)
+    tmp = f"{meta_path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+def _request(url, meta=None, timeout=DOWNLOAD_TIMEOUT):
+    """Requête GET, conditionnelle si `meta` contient ETag / Last-Modified.
+
+    Retourne (contenu, en-têtes), contenu valant None sur une réponse 304.
+    """
+    target = resolve_url(url)
+    request = urllib.request.Request(target, headers={"User-Agent": "SmartSDGTunisia"})
+    if meta:
+        if meta.get("etag"):
+            request.add_header("If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            request.add_header("If-Modified-Since", meta["last_modified"])
+    context = ssl_context(target) if target.startswith("https:") else None
+    try:
+        with urllib.request.urlopen(request, timeout=timeout, context=context) as response:
+            return response.read(), response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, e.headers
+        raise
+
+def _fetch(url, meta):
+    """Télécharge ou revalide `url` et met le cache à jour ; retourne les métadonnées."""
+    data, headers = _request(url, meta)
+    now = time.time()
+    if data is None:
+        meta = dict(meta, checked_at=now)
+    else:
+        path, _ = cache_paths(url)
+        os.makedirs(DOWNLOAD_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "fetched_at": now,
+            "checked_at": now,
+        }
+    _write_meta(url, meta)
+    return meta
+
+def _refresh_in_background(url, meta):
+    with _locks_guard:
+        if url in _refreshing:
+            return
+        _refreshing.add(url)
+
+    def run():
+        try:
+            with _lock_for(url):
+                _fetch(url, meta)
+        except (OSError, ValueError):
+            pass  # catalogue injoignable : la copie en cache reste servie
+        finally:
+            with _locks_guard:
+                _refreshing.discard(url)
+
+    threading.Thread(target=run, daemon=True, name="download-refresh").start()
+
+def mirror_path(url):
+    if not MIRROR_DIR:
+        return None
+    path = os.path.join(MIRROR_DIR, os.path.basename(urlsplit(url).path))
+    return path if os.path.isfile(path) else None
+
+def download(url, ttl=DOWNLOAD_TTL, stale=DOWNLOAD_STALE):
+    """Chemin local du fichier `url` et sa version (à passer aux fonctions en cache).
+
+    Le miroir local est prioritaire ; sinon le cache disque est servi selon
+    `ttl` / `stale`, et revalidé au besoin. Lève OSError si le fichier n'a
+    jamais pu être téléchargé.
+    """
+    mirrored = mirror_path(url)
+    if mirrored:
+        return mirrored, f"mirror-{os.path.getmtime(mirrored)}"
+
+    path, _ = cache_paths(url)
+    with _lock_for(url):
+        meta = read_meta(url)
+        if meta is None or not os.path.exists(path):
+            meta = _fetch(url, None)
+        else:
+            age = time.time() - meta["checked_at"]
+            if age > ttl + stale:
+                try:
+                    meta = _fetch(url, meta)
+                except (OSError, ValueError):
+                    pass  # catalogue injoignable : copie périmée plutôt que rien
+            elif age > ttl:
+                _refresh_in_background(url, meta)
+    return path, meta["sha256"]
+
+if __name__ == "__main__":
+    # Pré-remplit le cache : python -m scripts.download_cache URL [URL...]
+    for url in sys.argv[1:]:
+        path, version = download(url, ttl=0, stale=0)
+        print(f"{url} -> {path} ({version[:12]})")
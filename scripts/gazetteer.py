@@ -0,0 +1,123 @@
+import re
+import unicodedata
+from difflib import get_close_matches
+import pandas as pd
+import streamlit as st
+from scripts.arabic_utils import normalize_key
+from scripts.tracing import traced, cache_miss
+
+# Score minimal (difflib) pour accepter une correspondance approchée
+FUZZY_CUTOFF = 0.85
+
+@st.cache_data(persist="disk", show_spinner=False)
+@cache_miss
+def build_station_index(stations, delegations):
+    """Associe chaque station pluviométrique à la (ou les) délégation(s) de même nom.
+
+    `stations` : noms de stations uniques ; `delegations` : couples (del_id, del_ar).
+    La correspondance se fait sur les noms normalisés (normalize_key), avec un
+    repli approché pour les variantes d'orthographe. Le résultat est mis en
+    cache sur disque : il n'est recalculé que pour un nouveau jeu de stations.
+    """
+    by_name = {}
+    for del_id, del_ar in delegations:
+        key = normalize_key(del_ar)
+        if key and isinstance(del_id, str):
+            by_name.setdefault(key, []).append(del_id)
+    names = list(by_name)
+
+    station_to_del = {}
+    fuzzy = {}
+    unmatched = []
+    for station in stations:
+        key = normalize_key(station)
+        del_ids = by_name.get(key)
+        if del_ids is None:
+            close = get_close_matches(key, names, n=1, cutoff=FUZZY_CUTOFF)
+            if not close:
+                unmatched.append(station)
+                continue
+            del_ids = by_name[close[0]]
+            fuzzy[station] = close[0]
+        station_to_del[station] = del_ids
+
+    del_to_stations = {}
+    for station, del_ids in station_to_del.items():
+        for del_id in del_ids:
+            del_to_stations.setdefault(del_id, []).append(station)
+
+    return {
+        'station_to_del': station_to_del,
+        'del_to_stations': del_to_stations,
+        'fuzzy': fuzzy,
+        'unmatched': unmatched,
+    }
+
+@traced("station_index", cache=True)
+def station_index_for(df, gdf_del):
+    stations = tuple(sorted(pd.unique(df['station'].dropna()).tolist()))
+    delegations = tuple(zip(gdf_del['del_id'], gdf_del['del_ar']))
+    return build_station_index(stations, delegations)
+
+# Graphies latines des gouvernorats rencontrées dans les fichiers Excel, après
+# latin_key, et graphie correspondante dans les contours (gouv_fr)
+GOUV_ALIASES = {
+    "jendouba": "jandouba",
+    "medenine": "mednine",
+}
+_ARTICLES = ("le ", "la ", "el ")
+
+def latin_key(text):
+    """Nom latin réduit pour la comparaison : sans accents, casse, article ni lettres doublées."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[^a-z]+", " ", text).strip()
+    for article in _ARTICLES:
+        if text.startswith(article):
+            text = text[len(article):]
+    text = re.sub(r"(.)\1+", r"\1", text)
+    return GOUV_ALIASES.get(text, text)
+
+@st.cache_data(persist="disk", show_spinner=False)
+@cache_miss
+def build_gouv_index(names, gouvernorats):
+    """Associe chaque nom de gouvernorat d'un fichier à son gouv_id.
+
+    `names` : noms du fichier ; `gouvernorats` : couples (gouv_id, gouv_fr).
+    Les noms sont comparés après latin_key (accents, casse, translittérations
+    connues), avec un repli approché. Calculé une fois par jeu de noms.
+    """
+    by_name = {}
+    labels = {}
+    for gouv_id, gouv_fr in gouvernorats:
+        by_name.setdefault(latin_key(gouv_fr), gouv_id)
+        labels.setdefault(gouv_id, gouv_fr)
+    keys = list(by_name)
+
+    name_to_gouv = {}
+    fuzzy = {}
+    unmatched = []
+    for name in names:
+        key = latin_key(name)
+        gouv_id = by_name.get(key)
+        if gouv_id is None:
+            close = get_close_matches(key, keys, n=1, cutoff=FUZZY_CUTOFF)
+            if not close:
+                unmatched.append(name)
+                continue
+            gouv_id = by_name[close[0]]
+            fuzzy[name] = labels[gouv_id]
+        name_to_gouv[name] = gouv_id
+
+    return {
+        'name_to_gouv': name_to_gouv,
+        'gouv_to_name': {gouv_id: name for name, gouv_id in name_to_gouv.items()},
+        'fuzzy': fuzzy,
+        'unmatched': unmatched,
+    }
+
+@traced("gouv_index", cache=True)
+def gouv_index_for(names, gdf_del):
+    """Jointure noms -> gouv_id, les couples (gouv_id, gouv_fr) étant lus dans les délégations."""
+    gouvernorats = tuple(gdf_del[['gouv_id', 'gouv_fr']].drop_duplicates().itertuples(index=False, name=None))
+    return build_gouv_index(tuple(sorted(str(name) for name in names)), gouvernorats)
@@ -1,19 +1,260 @@
+import hashlib
+import os
 import geopandas as gpd
-from shapely.geometry import Point
-import streamlit as st
+import numpy as np
+import shapely
+from scripts.registry import shared
+from scripts.tracing import traced, cache_miss
 
-@st.cache_data
+GOUV_PATH = "data/TN-gouvernorats.geojson"
+DEL_PATH = "data/TN-delegations_raw.geojson"
+GEO_CACHE_DIR = "data/cache/geo"
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+def compiled_path(path, digest=None):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(GEO_CACHE_DIR, f"{stem}-{digest or file_digest(path)}.parquet")
+
+def compile_geodata(path):
+    """Compile un GeoJSON en GeoParquet (géométries WKB) et supprime les anciennes versions."""
+    digest = file_digest(path)
+    target = compiled_path(path, digest)
+    gdf = gpd.read_file(path)
+    os.makedirs(GEO_CACHE_DIR, exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    gdf.to_parquet(tmp, index=False)
+    os.replace(tmp, target)
+
+    _remove_stale(path, digest)
+    return target
+
+def _remove_stale(path, digest):
+    # Supprime les fichiers compilés (et niveaux de détail) d'une ancienne version du GeoJSON
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for name in os.listdir(GEO_CACHE_DIR):
+        if name.startswith(f"{stem}-") and not name.startswith(f"{stem}-{digest}"):
+            os.remove(os.path.join(GEO_CACHE_DIR, name))
+
+def read_geodata(path):
+    # Le fichier compilé n'est reconstruit que si le contenu du GeoJSON a changé
+    target = compiled_path(path)
+    if not os.path.exists(target):
+        try:
+            target = compile_geodata(path)
+        except (OSError, ImportError):
+            return gpd.read_file(path)
+    return gpd.read_parquet(target)
+
+@cache_miss
+def _read_boundaries():
+    return read_geodata(GOUV_PATH), read_geodata(DEL_PATH)
+
+@traced("load_geodata", cache=True)
 def load_geodata():
-    gdf_gouv = gpd.read_file("data/TN-gouvernorats.geojson")
-    gdf_del = gpd.read_file("data/TN-delegations_raw.geojson")
-    return gdf_gouv, gdf_del
+    """Gouvernorats et délégations, chargés une fois par processus (vues partagées en lecture seule)."""
+    return shared("geodata", _read_boundaries, sources=[GOUV_PATH, DEL_PATH])
+
+# Pyramide de niveaux de détail pour l'affichage : (zoom max, tolérance de
+# simplification en degrés, nombre de décimales conservées)
+LOD_LEVELS = [
+    (7, 0.01, 3),
+    (9, 0.002, 4),
+    (None, 0.0003, 5),
+]
+
+def level_for_zoom(zoom):
+    for level, (max_zoom, _, _) in enumerate(LOD_LEVELS):
+        if max_zoom is None or (zoom or 0) <= max_zoom:
+            return level
+    return len(LOD_LEVELS) - 1
+
+# Fonctions de couverture : coverage_simplify (Shapely >= 2.1, GEOS >= 3.12),
+# coverage_clean (Shapely >= 2.2, GEOS >= 3.14)
+HAS_COVERAGE_SIMPLIFY = hasattr(shapely, "coverage_simplify") and shapely.geos_version >= (3, 12, 0)
+HAS_COVERAGE_CLEAN = hasattr(shapely, "coverage_clean") and shapely.geos_version >= (3, 14, 0)
+
+def simplify_coverage(gdf):
+    """Calcule tous les niveaux de détail d'une couche.
+
+    La simplification se fait sur la couverture entière (shapely.coverage_simplify) :
+    chaque frontière partagée est simplifiée une seule fois, donc deux
+    délégations voisines gardent exactement la même limite, sans trou ni chevauchement.
+    Avec un Shapely / GEOS plus ancien, chaque polygone est simplifié seul.
+    """
+    geoms = shapely.make_valid(np.asarray(gdf.geometry.values), method="structure", keep_collapsed=False)
+    if HAS_COVERAGE_CLEAN:
+        geoms = shapely.coverage_clean(geoms)
+    levels = []
+    for _, tolerance, decimals in LOD_LEVELS:
+        if HAS_COVERAGE_SIMPLIFY:
+            simplified = shapely.coverage_simplify(geoms, tolerance)
+        else:
+            simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+        # Quantification des coordonnées : les sommets partagés restent identiques
+        simplified = shapely.transform(simplified, lambda coords: np.round(coords, decimals))
+        levels.append(gdf.set_geometry(gpd.GeoSeries(simplified, index=gdf.index, crs=gdf.crs)))
+    return levels
+
+# À incrémenter quand le contenu des niveaux change à GeoJSON identique
+# (2 : attributs des gouvernorats réparés)
+LOD_REVISION = 2
+
+def lod_path(path, level, digest=None):
+    return compiled_path(path, digest).replace(".parquet", f"-lod{level}-r{LOD_REVISION}.parquet")
+
+def _lod_source(path):
+    # Les gouvernorats sont simplifiés avec les attributs réparés par l'index spatial
+    return load_gouvernorats() if path == GOUV_PATH else read_geodata(path)
+
+def compile_lod(path):
+    digest = file_digest(path)
+    targets = []
+    for level, gdf in enumerate(simplify_coverage(_lod_source(path))):
+        target = lod_path(path, level, digest)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        gdf.to_parquet(tmp, index=False)
+        os.replace(tmp, target)
+        targets.append(target)
+    # Niveaux d'une révision précédente pour le même GeoJSON
+    prefix = os.path.basename(compiled_path(path, digest)).replace(".parquet", "-lod")
+    for name in os.listdir(GEO_CACHE_DIR):
+        stale = os.path.join(GEO_CACHE_DIR, name)
+        if name.startswith(prefix) and name.endswith(".parquet") and stale not in targets:
+            os.remove(stale)
+    return targets
+
+def read_lod(path, level):
+    target = lod_path(path, level)
+    if not os.path.exists(target):
+        try:
+            target = compile_lod(path)[level]
+        except OSError:
+            return simplify_coverage(_lod_source(path))[level]
+    return gpd.read_parquet(target)
+
+@traced("load_boundaries", cache=True)
+def load_boundaries(level):
+    """Délégations et gouvernorats simplifiés pour l'affichage (la géométrie exacte reste dans load_geodata)."""
+    read = cache_miss(lambda: (read_lod(GOUV_PATH, level), read_lod(DEL_PATH, level)))
+    return shared(f"boundaries-{level}", read, sources=[GOUV_PATH, DEL_PATH], parents=["gouvernorats"])
+
+class SpatialIndex:
+    """Index point-dans-polygone (STRtree + géométries préparées) sur les délégations.
 
+    Dans le GeoJSON des gouvernorats, gouv_id / gouv_fr / gouv_ar sont décalés
+    (identifiants en double) : chaque polygone reprend ceux de la délégation
+    qui contient son point représentatif, avant toute recherche.
+    """
+
+    def __init__(self, gdf_gouv, gdf_del):
+        self.gdf_del = gdf_del.reset_index(drop=True)
+        del_geoms = np.asarray(self.gdf_del.geometry.values, dtype=object)
+        shapely.prepare(del_geoms)
+        self.del_tree = shapely.STRtree(del_geoms)
+
+        self.gdf_gouv = self._repair_gouv(gdf_gouv.reset_index(drop=True))
+        gouv_geoms = np.asarray(self.gdf_gouv.geometry.values, dtype=object)
+        shapely.prepare(gouv_geoms)
+        self.gouv_tree = shapely.STRtree(gouv_geoms)
+
+    def _repair_gouv(self, gdf_gouv):
+        points = gdf_gouv.geometry.representative_point()
+        positions = self.locate(points.x.to_numpy(), points.y.to_numpy())
+        found = positions >= 0
+        gouv = gdf_gouv.copy()
+        columns = ['gouv_id', 'gouv_fr', 'gouv_ar']
+        gouv.loc[found, columns] = self.gdf_del.iloc[positions[found]][columns].to_numpy()
+        return gouv
+
+    def locate(self, lons, lats):
+        """Retourne, pour chaque point, la position de la délégation (-1 si hors délégation)."""
+        return self._query(self.del_tree, lons, lats)
+
+    def locate_gouv(self, lons, lats):
+        """Position du gouvernorat contenant chaque point (-1 si aucun)."""
+        return self._query(self.gouv_tree, lons, lats)
+
+    @staticmethod
+    def _query(tree, lons, lats):
+        x = np.asarray(lons, dtype=float)
+        y = np.asarray(lats, dtype=float)
+        result = np.full(len(x), -1, dtype=np.int64)
+        # Filtrage grossier par boîtes englobantes, puis test exact sur les
+        # polygones préparés, le tout en un seul appel vectorisé
+        point_idx, geom_idx = tree.query(shapely.points(x, y))
+        inside = shapely.contains_xy(tree.geometries[geom_idx], x[point_idx], y[point_idx])
+        point_idx, geom_idx = point_idx[inside], geom_idx[inside]
+        # En cas de frontière partagée, on garde la première géométrie trouvée
+        point_idx, first = np.unique(point_idx, return_index=True)
+        result[point_idx] = geom_idx[first]
+        return result
+
+    def lookup(self, lon, lat):
+        """Délégation et gouvernorat d'un point, en une seule requête sur l'index.
+
+        Le gouvernorat est lu dans les propriétés de la délégation (gouv_id,
+        gouv_fr, gouv_ar) ; la couche des gouvernorats ne sert qu'en dernier
+        recours, pour un point situé hors de toute délégation.
+        """
+        pos = self.locate([lon], [lat])[0]
+        if pos >= 0:
+            delegation = self.gdf_del.iloc[pos]
+            gouv = {
+                'gouv_id': delegation['gouv_id'],
+                'gouv_fr': delegation['gouv_fr'],
+                'gouv_ar': delegation['gouv_ar']
+            }
+            return delegation, gouv
+
+        pos = self.locate_gouv([lon], [lat])[0]
+        if pos >= 0:
+            row = self.gdf_gouv.iloc[pos]
+            return None, {'gouv_id': row['gouv_id'], 'gouv_fr': row['gouv_fr'], 'gouv_ar': row['gouv_ar']}
+        return None, None
+
+def load_spatial_index():
+    return shared("spatial_index", lambda: SpatialIndex(*load_geodata()), parents=["geodata"])
+
+def load_gouvernorats():
+    """Contours des gouvernorats avec des attributs fiables (ceux réparés par l'index spatial)."""
+    return shared("gouvernorats", lambda: load_spatial_index().gdf_gouv, parents=["geodata", "spatial_index"])
+
+def locate_points(lons, lats):
+    """Version vectorisée : DataFrame des délégations (del_id, del_fr, gouv_id...) pour chaque point."""
+    index = load_spatial_index()
+    positions = index.locate(lons, lats)
+    props = index.gdf_del.drop(columns="geometry")
+    found = props.reindex(positions).reset_index(drop=True)
+    found.insert(0, 'lon', np.asarray(lons, dtype=float))
+    found.insert(1, 'lat', np.asarray(lats, dtype=float))
+    return found
+
+@traced()
+def find_clicked_location(click_coords):
+    if not click_coords or 'lat' not in click_coords or 'lng' not in click_coords:
+        return None, None
+    return load_spatial_index().lookup(click_coords['lng'], click_coords['lat'])
+
+@traced()
+def find_clicked_gouvernorat(click_coords):
+    if not click_coords or 'lat' not in click_coords or 'lng' not in click_coords:
+        return None
+    index = load_spatial_index()
+    pos = index.locate_gouv([click_coords['lng']], [click_coords['lat']])[0]
+    return index.gdf_gouv.iloc[pos] if pos >= 0 else None
+
+@traced()
 def find_clicked_delegation(click_coords, gdf):
     if not click_coords or 'lat' not in click_coords or 'lng' not in click_coords:
         return None
-    
-    point = Point(click_coords['lng'], click_coords['lat'])
-    for _, row in gdf.iterrows():
-        if row['geometry'].contains(point):
-            return row
-    return None
+
+    inside = shapely.contains_xy(gdf.geometry.values, click_coords['lng'], click_coords['lat'])
+    if not inside.any():
+        return None
+    return gdf.iloc[int(np.argmax(inside))]
@@ -0,0 +1,74 @@
+import html
+from html.parser import HTMLParser
+
+# Balises et attributs conservés dans les descriptions HTML venues du catalogue
+# (tableaux d'attributs KML pour l'essentiel) ; tout le reste est retiré
+ALLOWED_TAGS = {
+    "a", "b", "br", "div", "em", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "i",
+    "li", "ol", "p", "span", "strong", "table", "tbody", "td", "th", "thead", "tr", "u", "ul",
+}
+ALLOWED_ATTRS = {"a": {"href", "title"}, "td": {"colspan", "rowspan"}, "th": {"colspan", "rowspan"}}
+VOID_TAGS = {"br", "hr"}
+# Contenu supprimé avec la balise elle-même
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "template", "noscript"}
+SAFE_URL_SCHEMES = ("http://", "https://", "mailto:")
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.text = []
+        self.open_tags = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth or tag not in ALLOWED_TAGS:
+            return
+        kept = []
+        for name, value in attrs:
+            if name not in ALLOWED_ATTRS.get(tag, ()) or value is None:
+                continue
+            if name == "href" and not value.strip().lower().startswith(SAFE_URL_SCHEMES):
+                continue
+            kept.append(f' {name}="{html.escape(value, quote=True)}"')
+        if tag == "a":
+            kept.append(' target="_blank" rel="noopener noreferrer"')
+        self.parts.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth or tag not in self.open_tags:
+            return
+        # Ferme aussi les balises restées ouvertes à l'intérieur
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.parts.append(f"</{current}>")
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(html.escape(data, quote=False))
+            self.text.append(data)
+
+def sanitize_html(fragment):
+    """HTML réduit aux balises de mise en forme sûres, et son texte brut (pour la recherche)."""
+    if fragment is None or fragment != fragment:
+        return "", ""
+    parser = _Sanitizer()
+    parser.feed(str(fragment))
+    parser.close()
+    parser.parts.extend(f"</{tag}>" for tag in reversed(parser.open_tags))
+    return "".join(parser.parts), " ".join(" ".join(parser.text).split())
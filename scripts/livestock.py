@@ -0,0 +1,146 @@
+import json
+import multiprocessing
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pandas as pd
+import streamlit as st
+from scripts.download_cache import download, DOWNLOAD_TTL
+from scripts.tracing import traced, cache_miss
+
+# Classeurs de répartition du cheptel (un par gouvernorat) publiés sur Agridata.tn.
+# Le manifeste vient de l'API CKAN du catalogue, ou d'un fichier local
+# (SMARTSDG_CHEPTEL_MANIFEST : liste JSON de {"gouvernorat": ..., "url": ...}).
+DATASET_ID = "repartition-du-cheptel"
+PACKAGE_SHOW_URL = f"https://catalog.agridata.tn/api/3/action/package_show?id={DATASET_ID}"
+MANIFEST_PATH = os.environ.get("SMARTSDG_CHEPTEL_MANIFEST", "data/cheptel_manifest.json")
+FALLBACK_MANIFEST = [{
+    "gouvernorat": "Tozeur",
+    "url": "https://catalog.agridata.tn/dataset/50049b47-d86a-41a6-863c-a0c407e6ffbf/resource/990e744a-9c63-43ef-b57c-7726b50d5a76/download/elevage-tozeur-1.xlsx",
+}]
+# Un téléchargement par classeur en parallèle : le tout dure autant que le plus lent
+FETCH_WORKERS = 32
+PARSE_WORKERS = min(os.cpu_count() or 1, 8)
+
+# Noms de colonnes normalisés (sans accents, minuscules) -> nom retenu
+COLUMN_ALIASES = {
+    "gouvernorat": "Gouvernorat",
+    "gouvernorats": "Gouvernorat",
+    "delegation": "Délégation",
+    "delegations": "Délégation",
+    "annee": "Année",
+}
+
+_FILE_RE = re.compile(r"elevage[-_](.+?)(?:[-_]\d+)?\.xlsx?$", re.IGNORECASE)
+
+def _plain(text):
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def governorate_from(resource):
+    """Nom du gouvernorat d'une ressource CKAN, déduit du nom de fichier (elevage-<gouvernorat>-1.xlsx)."""
+    match = _FILE_RE.search(os.path.basename(resource.get("url", "")))
+    if match:
+        return match.group(1).replace("-", " ").replace("_", " ").title()
+    return resource.get("name") or resource.get("url")
+
+def load_manifest():
+    """Liste des classeurs à charger : fichier local, sinon API CKAN, sinon le seul classeur connu."""
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    try:
+        path, _ = download(PACKAGE_SHOW_URL)
+        with open(path, encoding="utf-8") as f:
+            resources = json.load(f)["result"]["resources"]
+    except (OSError, ValueError, KeyError):
+        return FALLBACK_MANIFEST
+    manifest = [
+        {"gouvernorat": governorate_from(r), "url": r["url"]}
+        for r in resources
+        if str(r.get("format", "")).lower() in ("xlsx", "xls") or r.get("url", "").lower().endswith((".xlsx", ".xls"))
+    ]
+    return manifest or FALLBACK_MANIFEST
+
+@traced()
+def fetch_workbooks(manifest):
+    """Télécharge (ou lit en cache) tous les classeurs en parallèle.
+
+    Retourne ([(gouvernorat, chemin, version)], [(gouvernorat, erreur)]).
+    """
+    def fetch(entry):
+        name = entry.get("gouvernorat") or entry.get("url")
+        try:
+            return name, *download(entry["url"]), None
+        except (OSError, ValueError, KeyError) as e:
+            # Mêmes erreurs que pour le manifeste : statut HTTP, URL invalide, entrée incomplète
+            return name, None, None, str(e)
+
+    files, failures = [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(manifest)))) as pool:
+        for name, path, version, error in pool.map(fetch, manifest):
+            if error is None:
+                files.append((name, path, version))
+            else:
+                failures.append((name, error))
+    return files, failures
+
+def normalize_columns(df):
+    """Noms de colonnes uniformes entre classeurs, valeurs numériques converties."""
+    df = df.dropna(how="all").dropna(axis=1, how="all")
+    df.columns = [COLUMN_ALIASES.get(_plain(c), re.sub(r"\s+", " ", str(c)).strip().capitalize()) for c in df.columns]
+    df = df.loc[:, ~df.columns.duplicated()]
+    for column in df.columns:
+        if column in ("Gouvernorat", "Délégation"):
+            df[column] = df[column].astype("string").str.strip()
+        elif df[column].dtype == object:
+            converted = pd.to_numeric(df[column], errors="coerce")
+            if converted.notna().sum() >= df[column].notna().sum() / 2:
+                df[column] = converted
+    return df
+
+def parse_workbook(name, path):
+    """Lit un classeur (exécuté dans un processus du pool) et lui associe son gouvernorat."""
+    df = normalize_columns(pd.read_excel(path))
+    if "Gouvernorat" not in df:
+        df.insert(0, "Gouvernorat", name)
+    df["Gouvernorat"] = df["Gouvernorat"].fillna(name)
+    return df
+
+@traced("build_livestock_table", cache=True)
+@st.cache_data(show_spinner=False)
+@cache_miss
+def build_livestock_table(files):
+    """Table nationale du cheptel à partir de `files` ((gouvernorat, chemin, version), ...).
+
+    Les classeurs sont lus dans un pool de processus (openpyxl est limité par
+    le GIL) ; le cache est invalidé dès qu'une version change.
+    """
+    if not files:
+        return pd.DataFrame(columns=["Gouvernorat"])
+    names = [name for name, _, _ in files]
+    paths = [path for _, path, _ in files]
+    try:
+        # Processus démarrés par spawn : un fork du serveur Streamlit (multi-thread) peut se bloquer
+        with ProcessPoolExecutor(max_workers=max(1, min(PARSE_WORKERS, len(files))),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            frames = list(pool.map(parse_workbook, names, paths))
+    except (BrokenProcessPool, OSError):
+        # Création de processus impossible (environnement restreint) : lecture séquentielle
+        frames = [parse_workbook(name, path) for name, path in zip(names, paths)]
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+@traced("load_livestock", cache=True)
+@st.cache_data(show_spinner=False, ttl=DOWNLOAD_TTL)
+@cache_miss
+def load_livestock():
+    """Table nationale du cheptel et liste des classeurs qui n'ont pas pu être téléchargés.
+
+    Mis en cache pour la durée de fraîcheur des téléchargements : un rerun ne
+    relance ni le pool de téléchargement ni le pool de processus.
+    """
+    files, failures = fetch_workbooks(load_manifest())
+    return build_livestock_table(tuple(files)), failures
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import branca
+import folium
+import streamlit as st
+import streamlit_folium
+from folium.template import Template
+from streamlit_folium import st_folium
+from scripts.tracing import span, traced, cache_miss
+
+# Fonctions internes de streamlit-folium (testées avec 0.27.4, voir requirements.txt)
+# utilisées pour réutiliser le rendu d'une carte ; si l'une manque ou change de
+# signature, la carte est affichée avec st_folium, reconstruite à chaque rerun.
+PRIVATE_API = ("_component_func", "_get_html", "_get_header", "_get_map_string", "get_full_id", "generate_js_hash")
+_private_api_ok = all(hasattr(streamlit_folium, name) for name in PRIVATE_API)
+
+def config_key(config):
+    """Empreinte stable d'une configuration de carte (styles, infobulles, couches...)."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+def _walk(element):
+    yield element
+    for child in getattr(element, "_children", {}).values():
+        yield from _walk(child)
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+@cache_miss
+def _render_map(key, _build):
+    # Mêmes étapes de rendu que st_folium, exécutées une seule fois par configuration
+    m = _build()
+    m.get_root().render()
+    m.render()
+    html = streamlit_folium._get_html(m)
+    header = streamlit_folium._get_header(m)
+    script = streamlit_folium._get_map_string(m)
+
+    css_links, js_links = [], []
+    for element in _walk(m):
+        if isinstance(element, branca.colormap.ColorMap):
+            js_links[:0] = ["https://d3js.org/d3.v4.min.js", "https://cdnjs.cloudflare.com/ajax/libs/d3/3.5.5/d3.min.js"]
+        css_links.extend(href for _, href in getattr(element, "default_css", []))
+        js_links.extend(src for _, src in getattr(element, "default_js", []))
+
+    # Variables JS des couches nommées, pour les restyler sans reconstruire la carte
+    layers = {
+        element.layer_name: element.get_name()
+        for element in _walk(m)
+        if getattr(element, "layer_name", None)
+    }
+
+    southwest, northeast = m.get_bounds()
+    defaults = {
+        "last_clicked": None,
+        "last_object_clicked": None,
+        "last_object_clicked_count": None,
+        "last_object_clicked_tooltip": None,
+        "last_object_clicked_popup": None,
+        "all_drawings": None,
+        "last_active_drawing": None,
+        "bounds": {
+            "_southWest": {"lat": southwest[0], "lng": southwest[1]},
+            "_northEast": {"lat": northeast[0], "lng": northeast[1]},
+        },
+        "zoom": m.options.get("zoom"),
+        "last_circle_radius": None,
+        "last_circle_polygon": None,
+        "selected_layers": None,
+        "selected_tags": None,
+        "last_geocoder_result": None,
+    }
+    return {
+        "script": script,
+        "html": html,
+        "header": header,
+        "id": streamlit_folium.get_full_id(m),
+        "css_links": list(dict.fromkeys(css_links)),
+        "js_links": list(dict.fromkeys(js_links)),
+        "defaults": defaults,
+        "layers": layers,
+        "hashes": {},
+    }
+
+class KeepView(folium.MacroElement):
+    """Conserve le centre et le zoom de la carte dans le navigateur (sessionStorage).
+
+    Une carte reconstruite (autre niveau de détail) reprend la vue précédente
+    sans que le centre ait à être renvoyé à Streamlit à chaque déplacement.
+    """
+
+    _template = Template(
+        """
+            {% macro script(this, kwargs) -%}
+            (function(map) {
+                var storageKey = {{ this.storage_key|tojson }};
+                map.whenReady(function() {
+                    // Après l'initialisation du composant, pour qu'il renvoie le zoom restauré
+                    setTimeout(function() {
+                        try {
+                            var view = JSON.parse(window.sessionStorage.getItem(storageKey) || "null");
+                            if (view) { map.setView(view.center, view.zoom, {animate: false}); }
+                        } catch (e) {}
+                        map.on("moveend", function() {
+                            var center = map.getCenter();
+                            try {
+                                window.sessionStorage.setItem(storageKey, JSON.stringify(
+                                    {center: [center.lat, center.lng], zoom: map.getZoom()}));
+                            } catch (e) {}
+                        });
+                    }, 0);
+                });
+            })({{ this._parent.get_name() }});
+            {%- endmacro %}
+            """
+    )
+
+    def __init__(self, storage_key):
+        super().__init__()
+        self._name = "KeepView"
+        self.storage_key = storage_key
+
+def choropleth_styles(values, base_style, colors, caption=""):
+    """Styles par identifiant (index de `values`) et échelle de couleurs associée."""
+    values = values.dropna()
+    if values.empty:
+        return {}, None
+    colormap = branca.colormap.LinearColormap(colors, vmin=float(values.min()), vmax=max(float(values.max()), float(values.min()) + 1e-9), caption=caption)
+    styles = {
+        str(key): dict(base_style, fillColor=colormap.rgb_hex_str(value), fillOpacity=0.75)
+        for key, value in values.items()
+    }
+    return styles, colormap
+
+def restyle_script(layer, key_field, styles, default):
+    """JS qui recolore une couche GeoJson ou VectorGrid déjà affichée (`layer` : expression JS)."""
+    return f"""
+    (function() {{
+        var layer = {layer};
+        if (!layer) return;
+        var styles = {json.dumps(styles)};
+        var fallback = {json.dumps(default)};
+        var key = {json.dumps(key_field)};
+        if (layer.setStyle) {{
+            layer.setStyle(function(feature) {{ return styles[feature.properties[key]] || fallback; }});
+        }} else if (layer.options && layer.options.vectorTileLayerStyles) {{
+            Object.keys(layer.options.vectorTileLayerStyles).forEach(function(name) {{
+                layer.options.vectorTileLayerStyles[name] = function(props) {{
+                    return Object.assign({{fill: true}}, styles[props[key]] || fallback);
+                }};
+            }});
+            layer.redraw();
+        }}
+    }})();
+    """
+
+class Restyle(folium.MacroElement):
+    """Recoloration ajoutée à la carte elle-même (affichage sans réutilisation du rendu)."""
+
+    _template = Template(
+        """
+            {% macro script(this, kwargs) -%}
+            {{ this.script }}
+            {%- endmacro %}
+            """
+    )
+
+    def __init__(self, script):
+        super().__init__()
+        self._name = "Restyle"
+        self.script = script
+
+def _restyle_js(layers, restyle, global_names):
+    return "".join(
+        restyle_script(f"window[{json.dumps(layers[name])}]" if global_names else layers[name], key_field, styles, default)
+        for name, (key_field, styles, default) in (restyle or {}).items()
+        if name in layers
+    )
+
+def _st_folium_plain(build, key, height, width, returned_objects, zoom, center, restyle):
+    m = build()
+    if restyle:
+        layers = {e.layer_name: e.get_name() for e in _walk(m) if getattr(e, "layer_name", None)}
+        Restyle(_restyle_js(layers, restyle, global_names=False)).add_to(m)
+    return st_folium(m, key=key, height=height, width=width, returned_objects=returned_objects, zoom=zoom, center=center)
+
+@traced()
+def st_folium_cached(config, build, key=None, height=700, width=500, returned_objects=None, zoom=None, center=None, restyle=None):
+    """Affiche une carte Folium en réutilisant son rendu tant que `config` ne change pas.
+
+    `build` ne doit dépendre que de `config` : il n'est appelé qu'au premier
+    affichage d'une configuration donnée, les reruns suivants renvoient au
+    composant le HTML/JS déjà produit.
+
+    `restyle` ({nom de couche: (champ clé, {clé: style}, style par défaut)})
+    recolore des couches dans le navigateur : la carte n'est ni re-rendue ni
+    rechargée quand seuls ces styles changent.
+
+    Sans les fonctions internes attendues de streamlit-folium, la carte est
+    reconstruite à chaque rerun et affichée par st_folium.
+    """
+    global _private_api_ok
+    if not _private_api_ok:
+        return _st_folium_plain(build, key, height, width, returned_objects, zoom, center, restyle)
+
+    try:
+        # Sérialisation Folium (HTML/JS), faite une fois par configuration
+        with span("folium.rendu", cache=True):
+            rendered = _render_map(config_key(config), build)
+        hash_key = rendered["hashes"].get(key)
+        if hash_key is None:
+            hash_key = rendered["hashes"][key] = streamlit_folium.generate_js_hash(rendered["script"], key, False)
+    except (AttributeError, TypeError):
+        # Fonctions internes modifiées : affichage standard pour la suite du processus
+        _private_api_ok = False
+        return _st_folium_plain(build, key, height, width, returned_objects, zoom, center, restyle)
+
+    defaults = {
+        k: v for k, v in rendered["defaults"].items()
+        if returned_objects is None or k in returned_objects
+    }
+
+    # Passée au composant comme feature_group : évaluée dans la carte déjà affichée,
+    # sans renvoyer le script (et les géométries) quand seules les couleurs changent
+    restyle_js = _restyle_js(rendered["layers"], restyle, global_names=True) if restyle else None
+
+    def _on_change():
+        if key is not None:
+            st.session_state[key] = st.session_state.get(hash_key, {})
+
+    try:
+        return streamlit_folium._component_func(
+            script=rendered["script"],
+            header=rendered["header"],
+            html=rendered["html"],
+            id=rendered["id"],
+            key=hash_key,
+            height=height,
+            width=width,
+            returned_objects=returned_objects,
+            default=defaults,
+            zoom=zoom,
+            center=center,
+            feature_group=restyle_js,
+            return_on_hover=False,
+            layer_control=None,
+            pixelated=False,
+            css_links=rendered["css_links"],
+            js_links=rendered["js_links"],
+            on_change=_on_change,
+            wrap_longitude=False,
+        )
+    except TypeError:
+        # Signature du composant modifiée
+        _private_api_ok = False
+        return _st_folium_plain(build, key, height, width, returned_objects, zoom, center, restyle)
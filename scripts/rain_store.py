@@ -0,0 +1,262 @@
+import os
+import threading
+from urllib.parse import unquote
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from scripts.data_utils import RAIN_COLUMNS, CUMUL_COLUMNS, hydro_year, running_cumuls, cumul_mismatch, tag_frame, data_key
+from scripts.tracing import traced
+
+# Entrepôt Parquet des relevés pluviométriques, partitionné par station puis
+# par année (data/store/pluviometrie/station=.../year=.../part-0.parquet)
+STORE_DIR = "data/store/pluviometrie"
+UPLOADS_DIR = os.path.join(STORE_DIR, "_uploads")
+VERSION_FILE = os.path.join(STORE_DIR, "_version")
+ROW_GROUP_SIZE = 32 * 1024
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("station", pa.string()), ("year", pa.int32())]),
+    flavor="hive",
+)
+
+_write_lock = threading.RLock()
+_dataset_cache = {}
+
+def _to_table(df):
+    df = df.assign(
+        station=df['station'].astype(str),
+        year=df['Date'].dt.year.astype("int32"),
+    ).sort_values(['station', 'Date'])
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def _stored_pairs(df):
+    """Lignes stockées dans les partitions (station, année) de `df`, et masque de celles dont le jour est dans `df`."""
+    stations = set(df['station'].astype(str)).intersection(stored_stations())
+    if not stations:
+        return None, None
+    stored = query_rainfall(stations=stations, years=df['Date'].dt.year.unique().tolist())
+    if stored is None or stored.empty:
+        return None, None
+    pairs = pd.MultiIndex.from_arrays([df['station'].astype(str), df['Date'].dt.year])
+    stored = stored[pd.MultiIndex.from_arrays([stored['station'].astype(str), stored['Date'].dt.year]).isin(pairs)]
+    days = pd.MultiIndex.from_arrays([df['station'].astype(str), df['Date']])
+    same_day = pd.MultiIndex.from_arrays([stored['station'].astype(str), stored['Date']]).isin(days)
+    return stored, same_day
+
+def write_rainfall(df):
+    """Écrit les relevés de `df` dans l'entrepôt, en remplaçant les jours (station, Date) déjà stockés.
+
+    Une partition station/année est réécrite en entier : les jours stockés
+    absents de `df` y sont conservés.
+    """
+    if df.empty:
+        return
+    with _write_lock:
+        stored, same_day = _stored_pairs(df)
+        if stored is not None:
+            kept = stored[~same_day]
+            if not kept.empty:
+                df = pd.concat([kept.assign(station=kept['station'].astype(str)),
+                                df.assign(station=df['station'].astype(str))], ignore_index=True)
+                if 'Cumul_incoherent' in df:
+                    df['Cumul_incoherent'] = df['Cumul_incoherent'].fillna(False).astype(bool)
+        ds.write_dataset(
+            _to_table(df),
+            STORE_DIR,
+            format="parquet",
+            partitioning=PARTITIONING,
+            existing_data_behavior="delete_matching",
+            basename_template="part-{i}.parquet",
+            max_partitions=1 << 20,
+            max_rows_per_group=ROW_GROUP_SIZE,
+            min_rows_per_group=min(ROW_GROUP_SIZE, len(df)),
+        )
+        # Signale aux lecteurs (de ce processus ou d'un autre) que la liste des fichiers a changé
+        with open(VERSION_FILE, "w") as f:
+            f.write(str(pd.Timestamp.now()))
+
+def _upload_marker(df):
+    digest = df.attrs.get('source_digest')
+    return os.path.join(UPLOADS_DIR, digest) if digest else None
+
+def _mark_ingested(marker):
+    if marker:
+        os.makedirs(UPLOADS_DIR, exist_ok=True)
+        open(marker, "w").close()
+
+def ingest_upload(df, on_change=None):
+    """Verse un fichier importé dans l'entrepôt, une seule fois par contenu.
+
+    `on_change(nouvelles_lignes, lignes_remplacées)` est appelé après l'écriture,
+    pour tenir à jour les agrégats dérivés (rollups).
+    """
+    marker = _upload_marker(df)
+    if marker and os.path.exists(marker):
+        return False
+    with _write_lock:
+        replaced = replaced_rows(df) if on_change is not None else None
+        write_rainfall(df)
+        if on_change is not None:
+            on_change(df, replaced)
+    _mark_ingested(marker)
+    return True
+
+def append_bulletin(df, on_change=None):
+    """Ajoute un bulletin journalier à l'entrepôt sans relire l'historique.
+
+    Les doublons (station, Date) sont résolus en faveur de la dernière valeur,
+    y compris face à un jour déjà stocké. Seules les années hydrologiques
+    touchées sont relues, pour prolonger Cumul_du_mois et Cumul_periode à
+    partir du dernier cumul connu. `on_change` reçoit les jours ajoutés ou
+    modifiés et leurs anciennes valeurs. Retourne le nombre de jours écrits.
+    """
+    marker = _upload_marker(df)
+    if marker and os.path.exists(marker):
+        return 0
+    new = df.drop_duplicates(['station', 'Date'], keep='last')
+    new = new.assign(station=new['station'].astype(str), **{c: np.nan for c in RAIN_COLUMNS if c not in new})
+    if new.empty:
+        return 0
+
+    with _write_lock:
+        # L'année hydrologique y s'étend sur les années civiles y et y + 1
+        seasons = hydro_year(new['Date'])
+        years = range(int(seasons.min()), int(seasons.max()) + 2)
+        stored = query_rainfall(stations=new['station'].unique(), years=years)
+        columns = ['Date', 'station', *RAIN_COLUMNS, 'Cumul_incoherent']
+        if stored is None or stored.empty:
+            stored = new.iloc[:0]
+        stored = stored.assign(station=stored['station'].astype(str))
+        if 'Cumul_incoherent' not in stored:
+            stored = stored.assign(Cumul_incoherent=False)
+        stored = stored[columns]
+
+        merged = pd.concat([stored, new.assign(Cumul_incoherent=False)[columns]], ignore_index=True)
+        merged = merged.drop_duplicates(['station', 'Date'], keep='last')
+        merged = merged.sort_values(['station', 'Date'], ignore_index=True)
+        merged[RAIN_COLUMNS] = merged[RAIN_COLUMNS].astype('float32')
+        merged['Cumul_incoherent'] = merged['Cumul_incoherent'].fillna(False).astype(bool)
+
+        # Recalcul à partir du premier jour du bulletin, jusqu'à la fin de son année hydrologique
+        first = merged['station'].map(new.groupby('station')['Date'].min())
+        last_season = merged['station'].map(seasons.groupby(new['station']).max())
+        since = (merged['Date'] >= first) & (hydro_year(merged['Date']) <= last_season)
+        computed = running_cumuls(merged, since)
+
+        # Les cumuls éventuellement fournis par le bulletin sont contrôlés, puis remplacés
+        days = pd.MultiIndex.from_frame(new[['station', 'Date']])
+        is_new = pd.MultiIndex.from_frame(merged[['station', 'Date']]).isin(days)
+        merged.loc[is_new, 'Cumul_incoherent'] = cumul_mismatch(merged, computed)[is_new]
+        merged[CUMUL_COLUMNS] = computed
+
+        write_rainfall(merged)
+        if on_change is not None:
+            added = merged[is_new]
+            removed = stored[pd.MultiIndex.from_frame(stored[['station', 'Date']]).isin(days)]
+            on_change(added, removed)
+    _mark_ingested(marker)
+    return len(new)
+
+def store_version():
+    """Change à chaque écriture dans l'entrepôt (0 s'il est vide)."""
+    return os.stat(VERSION_FILE).st_mtime_ns if os.path.exists(VERSION_FILE) else 0
+
+def _dataset():
+    # La découverte des fichiers n'est refaite qu'après une écriture
+    version = store_version()
+    cached = _dataset_cache.get(STORE_DIR)
+    if cached is None or cached[0] != version:
+        dataset = ds.dataset(
+            STORE_DIR,
+            format="parquet",
+            partitioning=PARTITIONING,
+            exclude_invalid_files=True,
+            ignore_prefixes=["_", "."],
+        )
+        cached = _dataset_cache[STORE_DIR] = (version, dataset)
+    return cached[1]
+
+def replaced_rows(df):
+    """Lignes actuellement stockées pour les jours (station, Date) que `df` va remplacer."""
+    stored, same_day = _stored_pairs(df)
+    return stored[same_day] if stored is not None else None
+
+def query_rainfall(start=None, end=None, stations=None, columns=None, years=None):
+    """Relevés des `stations` entre `start` et `end` (inclus).
+
+    Les filtres portent sur les clés de partition (station, year) et sur Date :
+    seuls les répertoires et groupes de lignes concernés sont lus.
+    """
+    if not os.path.isdir(STORE_DIR):
+        return None
+    # Lue avant les fichiers : une écriture concurrente donne au pire une clé déjà périmée
+    version = store_version()
+    origin = ("entrepôt", version, str(start), str(end),
+              None if stations is None else tuple(sorted(map(str, stations))),
+              None if columns is None else tuple(columns),
+              None if years is None else tuple(sorted(map(int, years))))
+
+    conditions = []
+    if stations is not None:
+        conditions.append(ds.field('station').isin([str(s) for s in stations]))
+    if years is not None:
+        conditions.append(ds.field('year').isin([int(y) for y in years]))
+    if start is not None:
+        start = pd.Timestamp(start)
+        conditions.append(ds.field('year') >= start.year)
+        conditions.append(ds.field('Date') >= pa.scalar(start, type=pa.timestamp('ns')))
+    if end is not None:
+        end = pd.Timestamp(end)
+        conditions.append(ds.field('year') <= end.year)
+        conditions.append(ds.field('Date') < pa.scalar(end + pd.Timedelta(days=1), type=pa.timestamp('ns')))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    dataset = _dataset()
+    if columns is not None:
+        columns = list(dict.fromkeys(['Date', 'station', *columns]))
+    table = dataset.to_table(columns=columns, filter=expression)
+    df = table.to_pandas()
+    df = df.drop(columns=['year'], errors='ignore')
+    df['station'] = df['station'].astype('category')
+    if 'Cumul_incoherent' in df:
+        # Absent des fichiers écrits avant le contrôle des cumuls
+        df['Cumul_incoherent'] = df['Cumul_incoherent'].fillna(False).astype(bool)
+    df = df[['Date', 'station', *[c for c in df.columns if c not in ('Date', 'station')]]]
+    return tag_frame(df.sort_values(['station', 'Date'], ignore_index=True), *origin)
+
+def stored_stations():
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(
+        unquote(name.split("=", 1)[1])
+        for name in os.listdir(STORE_DIR)
+        if name.startswith("station=")
+    )
+
+@traced()
+def select_period(df, start, end, on_change=None):
+    """Relevés d'un fichier importé sur une période, lus dans l'entrepôt.
+
+    Le fichier y est versé au premier appel ; si l'entrepôt n'est pas
+    accessible en écriture, on filtre le DataFrame en mémoire.
+    """
+    try:
+        ingest_upload(df, on_change)
+        return query_rainfall(start, end, stations=df['station'].unique())
+    except OSError:
+        start, end = pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)
+        return tag_frame(df[(df['Date'] >= start) & (df['Date'] < end)], data_key(df), str(start), str(end))
+
+@traced()
+def append_period(df, start, end, on_change=None):
+    """Ajoute un bulletin puis renvoie les relevés de toutes les stations stockées sur la période."""
+    try:
+        append_bulletin(df, on_change)
+        return query_rainfall(start, end)
+    except OSError:
+        start, end = pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)
+        return tag_frame(df[(df['Date'] >= start) & (df['Date'] < end)], data_key(df), str(start), str(end))
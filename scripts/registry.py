@@ -0,0 +1,192 @@
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from types import MappingProxyType
+import numpy as np
+import pandas as pd
+
+# Registre des données de référence partagées par toutes les sessions
+# (contours, classeur bio, index dérivés). Chaque entrée est chargée une fois
+# par processus ; les appelants reçoivent des vues : copies superficielles des
+# DataFrames, qui partagent les tableaux de l'entrée (copy-on-write : une
+# modification chez l'appelant copie la colonne concernée sans toucher à l'entrée).
+# Les rechargements sont explicites (reload) et versionnés par le contenu des
+# fichiers sources ; les vues déjà distribuées restent valides.
+
+def sources_digest(paths):
+    h = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:16]
+
+def copy_on_write():
+    """Copy-on-write actif (toujours avec pandas >= 3, sur option avant)."""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.get_option("mode.copy_on_write") is True
+
+def view(value):
+    """Vue en lecture seule de `value` : rien n'est recopié sous copy-on-write.
+
+    Sans copy-on-write, une copie superficielle partagerait les colonnes
+    modifiées sur place par l'appelant : la vue est alors une copie complète.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not copy_on_write())
+    if isinstance(value, tuple):
+        return tuple(view(v) for v in value)
+    if isinstance(value, dict):
+        return MappingProxyType({k: view(v) for k, v in value.items()})
+    return value
+
+def sizeof(value, _seen=None):
+    """Estimation (octets) de la mémoire occupée par `value`, sans compter deux fois un même objet."""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        size = int(frame.memory_usage(deep=True).sum())
+        for column in frame.columns:
+            if getattr(frame[column].dtype, "name", "") == "geometry":
+                import shapely
+                # Coordonnées (2 × float64 par sommet) en plus des pointeurs déjà comptés
+                size += int(shapely.get_num_coordinates(frame[column].values).sum()) * 16
+        return size
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(v, seen) for v in value)
+    if isinstance(value, (dict, MappingProxyType)):
+        return sum(sizeof(v, seen) for v in value.values())
+    if hasattr(value, "__dict__"):
+        return sizeof(vars(value), seen)
+    return 0
+
+class Registry:
+    """Entrées nommées, chargées à la demande et partagées par tous les threads."""
+
+    def __init__(self):
+        self._specs = {}
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._load_locks = defaultdict(threading.Lock)
+        self._generations = defaultdict(int)
+        self._families = {}
+
+    def register(self, name, loader, sources=(), parents=(), family=None, max_entries=None):
+        """Déclare une entrée : `loader()` la construit, `sources` (fichiers) la versionnent,
+        `parents` (autres entrées) la rendent obsolète quand ils sont rechargés.
+
+        Les entrées d'une même `family` (une par clé de contenu, par exemple)
+        sont limitées à `max_entries` : la moins récemment lue est écartée.
+        """
+        with self._lock:
+            self._specs.setdefault(name, (loader, tuple(sources), tuple(parents)))
+            if family is not None:
+                self._families[name] = (family, max_entries)
+
+    def get(self, name):
+        """Vue de l'entrée `name`, chargée au premier appel (une seule fois, même en concurrence)."""
+        entry = self._entries.get(name)
+        if entry is None:
+            with self._load_locks[name]:
+                entry = self._entries.get(name)
+                if entry is None:
+                    entry = self._load(name)
+                    self._evict(name)
+        entry["used"] = time.monotonic()
+        return view(entry["value"])
+
+    def _load(self, name):
+        loader, sources, parents = self._specs[name]
+        start = time.perf_counter()
+        version = sources_digest(sources) if sources else None
+        value = loader()
+        with self._lock:
+            self._generations[name] += 1
+            entry = self._entries[name] = {
+                "value": value,
+                "version": version,
+                "generation": self._generations[name],
+                "parents": parents,
+                "loaded_at": pd.Timestamp.now(),
+                "seconds": time.perf_counter() - start,
+                "nbytes": sizeof(value),
+                "used": time.monotonic(),
+            }
+        return entry
+
+    def _evict(self, name):
+        """Écarte les entrées les moins récemment lues de la famille de `name` au-delà de sa limite."""
+        family, max_entries = self._families.get(name, (None, None))
+        if family is None or max_entries is None:
+            return
+        with self._lock:
+            members = [n for n in self._entries if self._families.get(n, (None,))[0] == family]
+            members.sort(key=lambda n: self._entries[n]["used"])
+            for old in members[:max(0, len(members) - max_entries)]:
+                # La déclaration part aussi : son chargeur retient les données sources
+                del self._entries[old]
+                del self._specs[old]
+                del self._families[old]
+                self._load_locks.pop(old, None)
+
+    def version(self, name):
+        """Identifiant de version de l'entrée chargée (clé de cache pour les calculs dérivés)."""
+        entry = self._entries.get(name)
+        if entry is None:
+            self.get(name)
+            entry = self._entries[name]
+        return f"{entry['version']}-{entry['generation']}"
+
+    def _dependents(self, names):
+        found = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for name, (_, _, parents) in self._specs.items():
+                if name not in found and found.intersection(parents):
+                    found.add(name)
+                    changed = True
+        return found
+
+    def reload(self, names=None, force=False):
+        """Écarte les entrées dont les sources ont changé (toutes avec `force`) et celles qui en
+        dérivent ; elles sont rechargées au prochain get. Retourne les noms écartés."""
+        with self._lock:
+            candidates = list(self._entries) if names is None else [n for n in names if n in self._entries]
+            stale = []
+            for name in candidates:
+                entry = self._entries[name]
+                sources = self._specs[name][1]
+                if force or (sources and sources_digest(sources) != entry["version"]):
+                    stale.append(name)
+            dropped = sorted(self._dependents(stale).intersection(self._entries))
+            for name in dropped:
+                del self._entries[name]
+            return dropped
+
+    def memory_report(self):
+        """Une ligne par entrée chargée : version, génération, taille estimée, date et durée de chargement."""
+        with self._lock:
+            rows = [{
+                "entrée": name,
+                "version": entry["version"],
+                "génération": entry["generation"],
+                "taille_mo": round(entry["nbytes"] / 1e6, 2),
+                "chargée_le": entry["loaded_at"],
+                "durée_s": round(entry["seconds"], 3),
+            } for name, entry in sorted(self._entries.items())]
+        return pd.DataFrame(rows, columns=["entrée", "version", "génération", "taille_mo", "chargée_le", "durée_s"])
+
+REGISTRY = Registry()
+
+def shared(name, loader, sources=(), parents=(), family=None, max_entries=None):
+    """Vue partagée de l'entrée `name`, déclarée au premier appel."""
+    REGISTRY.register(name, loader, sources, parents, family, max_entries)
+    return REGISTRY.get(name)
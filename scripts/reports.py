@@ -0,0 +1,273 @@
+import argparse
+import hashlib
+import html
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import plotly.offline
+import streamlit.logger
+# Hors `streamlit run`, les caches avertissent de l'absence de contexte dès leur déclaration
+streamlit.logger.set_log_level("error")
+from scripts.chart_utils import CHART_MAX_POINTS
+from scripts.dashboard import delegation_stations, latest_readings, rainfall_figure, summary_figure
+from scripts.data_utils import parse_pluviometry
+from scripts.gazetteer import station_index_for
+from scripts.geo_utils import load_geodata
+from scripts.rain_store import query_rainfall
+from scripts.rollups import aggregate, stations_per_area
+
+# Rapports pluviométriques en lot, sans Streamlit : une page par délégation
+# (indicateurs et graphique du tableau de bord), une par gouvernorat et un
+# index national. Les gouvernorats sont répartis sur un pool de processus ;
+# chaque processus reçoit une fois les relevés de la période et l'index des stations.
+#
+#   python -m scripts.reports --start 2023-09-01 --end 2024-08-31 [--csv fichier.csv] [--workers 4] [--png]
+REPORTS_DIR = "data/reports"
+PLOTLY_JS = "plotly.min.js"
+GRAPH_TYPES = ["Courbe", "Barres", "Carte thermique"]
+
+PAGE = """<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; color: #222; }}
+.metrics {{ display: flex; gap: 1em; }}
+.metric {{ padding: 0.8em 1.2em; border-radius: 8px; background: #f5f7fa; }}
+.metric .label {{ font-size: 14px; color: #555; }}
+.metric .value {{ font-size: 24px; font-weight: bold; color: #1E90FF; }}
+table {{ border-collapse: collapse; margin-top: 1em; }}
+th, td {{ padding: 0.3em 0.8em; border-bottom: 1px solid #ddd; text-align: right; }}
+th:first-child, td:first-child {{ text-align: left; }}
+</style>
+</head>
+<body>
+<p>{breadcrumb}</p>
+<h1>{title}</h1>
+<p>Période du {start} au {end}</p>
+{body}
+</body>
+</html>
+"""
+
+# État des processus du pool, fourni une fois par _init_worker
+_state = {}
+
+def _init_worker(df, station_index, delegations, options):
+    _state.update(df=df, station_index=station_index, delegations=delegations, options=options)
+
+def period_totals(station_data):
+    """Cumul, jours de pluie et pluie journalière maximale sur la période (moyennés sur les stations)."""
+    rain = station_data['Pluvio_du_jour']
+    return {
+        'cumul': round(float(rain.groupby(station_data['station'], observed=True).sum().mean()), 1),
+        'jours_pluie': round(float((rain > 0).groupby(station_data['station'], observed=True).sum().mean()), 1),
+        'max_jour': round(float(station_data['Pluvio_du_jour'].max()), 1),
+    }
+
+def _metrics(items):
+    cards = "".join(
+        f"<div class='metric'><div class='label'>{html.escape(label)}</div><div class='value'>{value}</div></div>"
+        for label, value in items
+    )
+    return f"<div class='metrics'>{cards}</div>"
+
+def _table(rows, columns, link=None):
+    head = "".join(f"<th>{html.escape(label)}</th>" for _, label in columns)
+    lines = []
+    for row in rows:
+        cells = []
+        for i, (key, _) in enumerate(columns):
+            value = row.get(key)
+            text = "—" if value is None or value != value else html.escape(str(value))
+            if i == 0 and link and row.get(link):
+                text = f"<a href='{html.escape(row[link])}'>{text}</a>"
+            cells.append(f"<td>{text}</td>")
+        lines.append(f"<tr>{''.join(cells)}</tr>")
+    return f"<table><tr>{head}</tr>{''.join(lines)}</table>"
+
+def _write_page(path, title, body, breadcrumb=""):
+    options = _state["options"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(PAGE.format(title=html.escape(title), breadcrumb=breadcrumb, body=body,
+                            start=options["start"].date(), end=options["end"].date()))
+
+def _figure_html(fig, path, plotly_js):
+    if _state["options"]["png"]:
+        fig.write_image(os.path.splitext(path)[0] + ".png")
+    return fig.to_html(full_html=False, include_plotlyjs=plotly_js)
+
+TOTAL_COLUMNS = [
+    ("cumul", "Cumul période (mm)"),
+    ("jours_pluie", "Jours de pluie"),
+    ("max_jour", "Pluie max. (mm/j)"),
+    ("stations", "Stations"),
+]
+SUMMARY_COLUMNS = ['gouv_id', 'gouv_fr', 'del_id', 'del_fr', *dict(TOTAL_COLUMNS), 'page']
+
+def delegation_report(delegation, gouv_dir):
+    """Page d'une délégation ; retourne sa ligne de synthèse (None si aucun relevé)."""
+    options = _state["options"]
+    stations = delegation_stations(_state["station_index"], delegation['del_id'])
+    df = _state["df"]
+    station_data = df[df['station'].isin(stations)]
+    if station_data.empty:
+        return None
+
+    latest = latest_readings(station_data)
+    totals = period_totals(station_data)
+    fig = rainfall_figure(station_data, options["graph"], delegation['del_fr'], len(stations) > 1, options["max_points"])
+    path = os.path.join(gouv_dir, f"{delegation['del_id']}.html")
+    body = _metrics([
+        ("Pluie du jour", f"{latest['Pluvio_du_jour']} mm"),
+        ("Cumul mensuel", f"{latest['Cumul_du_mois']} mm"),
+        ("Cumul période", f"{totals['cumul']} mm"),
+        ("Jours de pluie", totals['jours_pluie']),
+        ("Pluie max.", f"{totals['max_jour']} mm"),
+    ])
+    body += f"<p>Stations : {html.escape(', '.join(map(str, stations)))}</p>"
+    body += _figure_html(fig, path, f"../{PLOTLY_JS}")
+    breadcrumb = f"<a href='../index.html'>Tunisie</a> › <a href='index.html'>{html.escape(delegation['gouv_fr'])}</a>"
+    _write_page(path, f"{delegation['del_fr']} ({delegation['del_ar']})", body, breadcrumb)
+    return {**totals, 'stations': len(stations)}
+
+def gouvernorat_report(gouv_id):
+    """Pages des délégations d'un gouvernorat puis page du gouvernorat ; retourne les lignes de synthèse."""
+    options = _state["options"]
+    delegations = _state["delegations"]
+    delegations = delegations[delegations['gouv_id'] == gouv_id]
+    gouv_fr = delegations['gouv_fr'].iloc[0]
+    gouv_dir = os.path.join(options["out"], gouv_id)
+    os.makedirs(gouv_dir, exist_ok=True)
+
+    rows = []
+    for delegation in delegations.sort_values('del_fr').to_dict('records'):
+        totals = delegation_report(delegation, gouv_dir)
+        rows.append({
+            'gouv_id': gouv_id, 'gouv_fr': gouv_fr,
+            'del_id': delegation['del_id'], 'del_fr': delegation['del_fr'],
+            **(totals or {}),
+            'page': f"{delegation['del_id']}.html" if totals else None,
+        })
+
+    stations = {s for del_id in delegations['del_id'] for s in delegation_stations(_state["station_index"], del_id)}
+    df = _state["df"]
+    gouv_data = df[df['station'].isin(stations)]
+    path = os.path.join(gouv_dir, "index.html")
+    body = ""
+    if not gouv_data.empty:
+        totals = period_totals(gouv_data)
+        body += _metrics([
+            ("Cumul période (moyenne des stations)", f"{totals['cumul']} mm"),
+            ("Jours de pluie", totals['jours_pluie']),
+            ("Pluie max.", f"{totals['max_jour']} mm"),
+        ])
+        fig = rainfall_figure(gouv_data, "Carte thermique", gouv_fr, True, options["max_points"])
+        body += _figure_html(fig, path, f"../{PLOTLY_JS}")
+    body += _table(rows, [("del_fr", "Délégation"), *TOTAL_COLUMNS], link="page")
+    _write_page(path, gouv_fr, body, "<a href='../index.html'>Tunisie</a>")
+    return rows
+
+def national_report(rows, cube, station_counts, gouv_names):
+    """Index national : synthèse de la dernière année hydrologique et tableau par gouvernorat."""
+    options = _state["options"]
+    # Colonnes fixes : aucune ligne n'a de totaux si aucune station n'est rattachée à une délégation
+    summary = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+    summary[['cumul', 'jours_pluie', 'max_jour']] = summary[['cumul', 'jours_pluie', 'max_jour']].astype('float64')
+    summary['stations'] = summary['stations'].astype('Int64')
+    summary.to_csv(os.path.join(options["out"], "summary.csv"), index=False)
+
+    by_gouv = (summary.dropna(subset=['cumul'])
+               .groupby(['gouv_id', 'gouv_fr'], as_index=False)
+               .agg(cumul=('cumul', 'mean'), jours_pluie=('jours_pluie', 'mean'),
+                    max_jour=('max_jour', 'max'), stations=('stations', 'sum')))
+    by_gouv[['cumul', 'jours_pluie']] = by_gouv[['cumul', 'jours_pluie']].round(1)
+    by_gouv['page'] = by_gouv['gouv_id'] + "/index.html"
+
+    path = os.path.join(options["out"], "index.html")
+    body = ""
+    if not cube.get(('gouvernorat', 'annee_hydro'), pd.DataFrame()).empty:
+        title, fig = summary_figure(cube, station_counts, gouv_names)
+        body += f"<h2>{html.escape(title.lstrip('# '))}</h2>"
+        body += _figure_html(fig, path, PLOTLY_JS)
+    if by_gouv.empty:
+        body += "<p>Aucune station des relevés n'est rattachée à une délégation.</p>"
+    body += _table(by_gouv.sort_values('gouv_fr').to_dict('records'), [("gouv_fr", "Gouvernorat"), *TOTAL_COLUMNS], link="page")
+    _write_page(path, "Pluviométrie — rapport national", body)
+    return path
+
+def load_rainfall(csv_path, start, end):
+    """Relevés de la période, lus dans un CSV (même lecture que l'import de la page) ou dans l'entrepôt."""
+    if csv_path:
+        with open(csv_path, "rb") as f:
+            data = f.read()
+        df = parse_pluviometry(hashlib.sha256(data).hexdigest(), data)
+        df = df[(df['Date'] >= start) & (df['Date'] < end + pd.Timedelta(days=1))]
+    else:
+        df = query_rainfall(start, end)
+    if df is None or df.empty:
+        return None
+    return df.sort_values(['station', 'Date'], ignore_index=True)
+
+def generate_reports(df, start, end, out=REPORTS_DIR, workers=None, graph="Courbe", png=False, max_points=CHART_MAX_POINTS):
+    """Écrit les rapports de la période dans `out` ; retourne le chemin de l'index national."""
+    gdf_gouv, gdf_del = load_geodata()
+    station_index = station_index_for(df, gdf_del)
+    delegations = pd.DataFrame(gdf_del.drop(columns='geometry'))
+    options = {"start": start, "end": end, "out": out, "graph": graph, "png": png, "max_points": max_points}
+
+    os.makedirs(out, exist_ok=True)
+    with open(os.path.join(out, PLOTLY_JS), "w", encoding="utf-8") as f:
+        f.write(plotly.offline.get_plotlyjs())
+
+    initargs = (df, station_index, delegations, options)
+    gouv_ids = sorted(delegations['gouv_id'].dropna().unique())
+    rows = []
+    if workers == 1:
+        _init_worker(*initargs)
+        for gouv_id in gouv_ids:
+            rows.extend(gouvernorat_report(gouv_id))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            for gouv_rows in pool.map(gouvernorat_report, gouv_ids):
+                rows.extend(gouv_rows)
+        _init_worker(*initargs)
+
+    del_to_gouv = dict(zip(gdf_del['del_id'], gdf_del['gouv_id']))
+    cube = aggregate(df, station_index['station_to_del'], del_to_gouv)
+    gouv_names = dict(zip(gdf_del['gouv_id'], gdf_del['gouv_fr']))
+    return national_report(rows, cube, stations_per_area(station_index, gdf_del), gouv_names)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rapports pluviométriques HTML par délégation, gouvernorat et national")
+    parser.add_argument("--start", required=True, help="début de la période (AAAA-MM-JJ)")
+    parser.add_argument("--end", required=True, help="fin de la période, incluse (AAAA-MM-JJ)")
+    parser.add_argument("--csv", help="fichier de relevés (défaut : l'entrepôt data/store/pluviometrie)")
+    parser.add_argument("--out", default=REPORTS_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--graph", choices=GRAPH_TYPES, default="Courbe")
+    parser.add_argument("--png", action="store_true", help="exporte aussi chaque graphique en PNG (nécessite kaleido)")
+    args = parser.parse_args(argv)
+
+    if args.png:
+        try:
+            import kaleido  # noqa: F401
+        except ImportError:
+            print("kaleido n'est pas installé : rapports générés sans PNG", file=sys.stderr)
+            args.png = False
+
+    start, end = pd.Timestamp(args.start), pd.Timestamp(args.end)
+    began = time.perf_counter()
+    df = load_rainfall(args.csv, start, end)
+    if df is None:
+        print("Aucun relevé sur la période", file=sys.stderr)
+        return 1
+    index = generate_reports(df, start, end, args.out, args.workers, args.graph, args.png)
+    print(f"{df['station'].nunique()} stations, {len(df)} relevés : {index} ({time.perf_counter() - began:.1f} s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import os
+import threading
+import pandas as pd
+import streamlit as st
+from scripts.tracing import traced, cache_miss
+from scripts.data_utils import hydro_year, season
+
+# Cube d'agrégats pluviométriques : (station | délégation | gouvernorat) x
+# (jour | mois | saison | année hydrologique). Les mesures sont additives,
+# ce qui permet de le mettre à jour par différence à chaque versement.
+ROLLUP_DIR = "data/store/rollups"
+MEASURES = ['total', 'jours', 'jours_pluie']
+
+GEO_LEVELS = {
+    'station': ['station'],
+    'delegation': ['del_id'],
+    'gouvernorat': ['gouv_id'],
+}
+TIME_LEVELS = {
+    'jour': ['Date'],
+    'mois': ['mois'],
+    'saison': ['annee_hydro', 'saison'],
+    'annee_hydro': ['annee_hydro'],
+}
+# station x jour n'est pas matérialisé : c'est l'entrepôt lui-même (rain_store)
+TABLES = [(geo, time) for geo in GEO_LEVELS for time in TIME_LEVELS if (geo, time) != ('station', 'jour')]
+
+_lock = threading.Lock()
+
+def station_mapping(station_to_del, del_to_gouv=None):
+    """Table station -> del_id (une ligne par délégation rattachée), avec gouv_id si `del_to_gouv` est fourni."""
+    mapping = pd.DataFrame(
+        [(station, del_id) for station, del_ids in station_to_del.items() for del_id in del_ids],
+        columns=['station', 'del_id'],
+    )
+    if del_to_gouv is not None:
+        mapping['gouv_id'] = mapping['del_id'].map(del_to_gouv)
+    return mapping
+
+def aggregate(rows, station_to_del, del_to_gouv):
+    """Agrège des relevés journaliers en un cube {(niveau géo, niveau temps): DataFrame}."""
+    base = pd.DataFrame({
+        'station': rows['station'].astype(str).to_numpy(),
+        'Date': rows['Date'].to_numpy(),
+        'total': rows['Pluvio_du_jour'].astype('float64').fillna(0).to_numpy(),
+        'jours': rows['Pluvio_du_jour'].notna().astype('int64').to_numpy(),
+        'jours_pluie': (rows['Pluvio_du_jour'] > 0).astype('int64').to_numpy(),
+    })
+    located = base.merge(station_mapping(station_to_del, del_to_gouv), on='station')
+
+    cube = {}
+    for geo, geo_cols in GEO_LEVELS.items():
+        source = base if geo == 'station' else located
+        # Niveau jour d'abord, les niveaux plus grossiers sont déduits de celui-ci
+        daily = source.groupby(geo_cols + ['Date'], as_index=False)[MEASURES].sum()
+        daily['mois'] = daily['Date'].dt.to_period('M').dt.to_timestamp()
+        daily['annee_hydro'] = hydro_year(daily['Date'])
+        daily['saison'] = season(daily['Date'])
+        for time, time_cols in TIME_LEVELS.items():
+            if (geo, time) not in TABLES:
+                continue
+            if time == 'jour':
+                cube[(geo, time)] = daily[geo_cols + time_cols + MEASURES]
+            else:
+                cube[(geo, time)] = daily.groupby(geo_cols + time_cols, as_index=False)[MEASURES].sum()
+    return cube
+
+def merge_cubes(cube, delta, sign=1):
+    merged = dict(cube)
+    for key, table in delta.items():
+        keys = GEO_LEVELS[key[0]] + TIME_LEVELS[key[1]]
+        change = table.copy()
+        change[MEASURES] = change[MEASURES] * sign
+        if key in cube:
+            change = pd.concat([cube[key], change], ignore_index=True)
+            change = change.groupby(keys, as_index=False)[MEASURES].sum()
+        merged[key] = change[change['jours'] > 0].reset_index(drop=True)
+    return merged
+
+def _table_path(key):
+    return os.path.join(ROLLUP_DIR, f"{key[0]}_{key[1]}.parquet")
+
+def read_cube():
+    cube = {}
+    for key in TABLES:
+        path = _table_path(key)
+        if os.path.exists(path):
+            cube[key] = pd.read_parquet(path)
+    return cube
+
+def write_cube(cube):
+    os.makedirs(ROLLUP_DIR, exist_ok=True)
+    for key, table in cube.items():
+        tmp = f"{_table_path(key)}.tmp"
+        table.to_parquet(tmp, index=False)
+        os.replace(tmp, _table_path(key))
+
+@traced()
+def update_rollups(new_rows, replaced_rows, station_index, gdf_del):
+    """Applique un versement au cube : + agrégats des nouvelles lignes, - ceux des lignes remplacées."""
+    del_to_gouv = dict(zip(gdf_del['del_id'], gdf_del['gouv_id']))
+    station_to_del = station_index['station_to_del']
+    with _lock:
+        cube = merge_cubes(read_cube(), aggregate(new_rows, station_to_del, del_to_gouv))
+        if replaced_rows is not None and not replaced_rows.empty:
+            cube = merge_cubes(cube, aggregate(replaced_rows, station_to_del, del_to_gouv), sign=-1)
+        write_cube(cube)
+    load_cube.clear()
+
+@traced("load_cube", cache=True)
+@st.cache_data(show_spinner=False)
+@cache_miss
+def load_cube():
+    return read_cube()
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def rainfall_by_delegation(key, _rows, _station_index):
+    """Cumul moyen par station de chaque délégation sur les relevés `_rows` (identifiés par `key`)."""
+    totals = _rows.groupby('station', observed=True)['Pluvio_du_jour'].sum().reset_index(name='total')
+    totals['station'] = totals['station'].astype(str)
+    located = totals.merge(station_mapping(_station_index['station_to_del']), on='station')
+    return located.groupby('del_id')['total'].mean()
+
+def stations_per_area(station_index, gdf_del):
+    """Nombre de stations rattachées à chaque délégation et à chaque gouvernorat."""
+    del_to_gouv = dict(zip(gdf_del['del_id'], gdf_del['gouv_id']))
+    counts = {}
+    for station, del_ids in station_index['station_to_del'].items():
+        for del_id in del_ids:
+            counts[del_id] = counts.get(del_id, 0) + 1
+        for gouv_id in {del_to_gouv.get(d) for d in del_ids}:
+            counts[gouv_id] = counts.get(gouv_id, 0) + 1
+    return counts
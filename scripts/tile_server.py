@@ -0,0 +1,203 @@
+import os
+import re
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import numpy as np
+import shapely
+import streamlit as st
+from folium.plugins import VectorGridProtobuf
+from folium.template import Template
+from scripts.geo_utils import GOUV_PATH, DEL_PATH, GEO_CACHE_DIR, file_digest, read_lod, level_for_zoom, LOD_REVISION
+
+# Serveur local de tuiles vectorielles (Mapbox Vector Tiles) pour les couches
+# délégations / gouvernorats. Activé avec SMARTSDG_VECTOR_TILES=1 ; il peut
+# tourner dans le processus Streamlit ou à part : python -m scripts.tile_server
+VECTOR_TILES_ENABLED = os.environ.get("SMARTSDG_VECTOR_TILES") == "1"
+TILE_HOST = os.environ.get("SMARTSDG_TILES_HOST", "127.0.0.1")
+TILE_PORT = int(os.environ.get("SMARTSDG_TILES_PORT", "8765"))
+TILE_CACHE_DIR = os.path.join(GEO_CACHE_DIR, "tiles")
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+LAYERS = {
+    "delegations": (DEL_PATH, ['del_id', 'del_fr', 'del_ar', 'gouv_id', 'gouv_fr']),
+    "gouvernorats": (GOUV_PATH, ['gouv_id', 'gouv_fr']),
+}
+
+_WORLD = 20037508.342789244
+_TILE_RE = re.compile(r"^/(\w+)/(\d+)/(\d+)/(\d+)\.pbf$")
+
+def tile_bounds(z, x, y):
+    """Emprise d'une tuile XYZ en Web Mercator (EPSG:3857)."""
+    size = 2 * _WORLD / (1 << z)
+    minx = -_WORLD + x * size
+    maxy = _WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+class LayerSource:
+    """Géométries d'une couche projetées en EPSG:3857, pour chaque niveau de détail."""
+
+    def __init__(self, path, fields):
+        self.digest = file_digest(path)
+        self.mtime = os.path.getmtime(path)
+        self.fields = fields
+        self._levels = {}
+        self._path = path
+        self._lock = threading.Lock()
+
+    def level(self, level):
+        with self._lock:
+            if level not in self._levels:
+                gdf = read_lod(self._path, level).to_crs(epsg=3857)
+                geoms = np.asarray(gdf.geometry.values, dtype=object)
+                props = gdf[self.fields].astype(str).to_dict("records")
+                self._levels[level] = (shapely.STRtree(geoms), geoms, props)
+            return self._levels[level]
+
+    def encode(self, name, z, x, y):
+        import mapbox_vector_tile
+
+        tree, geoms, props = self.level(level_for_zoom(z))
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        pad = (maxx - minx) * TILE_BUFFER / TILE_EXTENT
+        candidates = tree.query(shapely.box(minx - pad, miny - pad, maxx + pad, maxy + pad))
+        if len(candidates) == 0:
+            return b""
+        clipped = shapely.clip_by_rect(geoms[candidates], minx - pad, miny - pad, maxx + pad, maxy + pad)
+        features = [
+            {"geometry": geom, "properties": props[i]}
+            for i, geom in zip(candidates, clipped)
+            if not geom.is_empty
+        ]
+        if not features:
+            return b""
+        return mapbox_vector_tile.encode(
+            [{"name": name, "features": features}],
+            default_options={"quantize_bounds": (minx, miny, maxx, maxy), "extents": TILE_EXTENT},
+        )
+
+_SOURCES = {}
+_SOURCES_LOCK = threading.Lock()
+
+def get_source(name):
+    path, fields = LAYERS[name]
+    with _SOURCES_LOCK:
+        source = _SOURCES.get(name)
+        mtime = os.path.getmtime(path)
+        # Le GeoJSON n'est re-haché que si sa date de modification a changé
+        if source is not None and source.mtime != mtime:
+            if source.digest == file_digest(path):
+                source.mtime = mtime  # simple touch ou copie : contenu inchangé
+            else:
+                source = None
+        if source is None:
+            source = _SOURCES[name] = LayerSource(path, fields)
+            _remove_stale_tiles(name, _tile_dir(name, source))
+    return source
+
+def _tile_dir(name, source):
+    # La révision des niveaux invalide aussi les tuiles déjà écrites (attributs réparés)
+    return os.path.join(TILE_CACHE_DIR, f"{name}-{source.digest}-r{LOD_REVISION}")
+
+def _remove_stale_tiles(name, current):
+    if not os.path.isdir(TILE_CACHE_DIR):
+        return
+    for entry in os.listdir(TILE_CACHE_DIR):
+        path = os.path.join(TILE_CACHE_DIR, entry)
+        if entry.startswith(f"{name}-") and path != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+def get_tile(name, z, x, y):
+    """Tuile encodée, lue dans le cache disque ou générée puis enregistrée."""
+    source = get_source(name)
+    cache_path = os.path.join(_tile_dir(name, source), str(z), str(x), f"{y}.pbf")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            return f.read()
+
+    data = source.encode(name, z, x, y)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp = f"{cache_path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, cache_path)
+    return data
+
+class TileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        match = _TILE_RE.match(self.path.split("?")[0])
+        if not match or match.group(1) not in LAYERS:
+            self.send_error(404)
+            return
+        name, z, x, y = match.group(1), *map(int, match.groups()[1:])
+        if x >= (1 << z) or y >= (1 << z):
+            self.send_error(404)
+            return
+        data = get_tile(name, z, x, y)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "public, max-age=86400")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def tiles_url():
+    return os.environ.get("SMARTSDG_TILES_URL", f"http://{TILE_HOST}:{TILE_PORT}")
+
+@st.cache_resource
+def start_tile_server():
+    """Démarre le serveur de tuiles dans un thread (une seule fois par processus)."""
+    try:
+        server = ThreadingHTTPServer((TILE_HOST, TILE_PORT), TileHandler)
+    except OSError:
+        # Port déjà pris : un serveur lancé à part (python -m scripts.tile_server) répond déjà
+        return tiles_url()
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="tile-server").start()
+    return tiles_url()
+
+class VectorTileLayer(VectorGridProtobuf):
+    """Couche VectorGrid avec infobulles au survol, comme folium.GeoJsonTooltip."""
+
+    _template = Template(
+        """
+            {% macro script(this, kwargs) -%}
+            var {{ this.get_name() }} = L.vectorGrid.protobuf(
+                '{{ this.url }}',
+                {{ this.options|tojavascript }}
+            );
+            {{ this.get_name() }}.on('mouseover', function(e) {
+                var props = e.layer.properties || {};
+                var rows = {{ this.tooltip_fields|tojson }}.map(function(field, i) {
+                    return '<tr><th>' + {{ this.tooltip_aliases|tojson }}[i] + '</th><td>'
+                        + (props[field] === undefined ? '' : props[field]) + '</td></tr>';
+                });
+                {{ this.get_name() }}.bindTooltip('<table>' + rows.join('') + '</table>', {sticky: true})
+                    .openTooltip(e.latlng);
+            });
+            {{ this.get_name() }}.on('mouseout', function(e) {
+                {{ this.get_name() }}.closeTooltip();
+            });
+            {%- endmacro %}
+            """
+    )
+
+    def __init__(self, base_url, layer, style, tooltip_fields, tooltip_aliases, name=None):
+        options = {
+            "interactive": True,
+            "maxNativeZoom": 14,
+            "vectorTileLayerStyles": {layer: dict(style, fill=True)},
+        }
+        super().__init__(f"{base_url}/{layer}/{{z}}/{{x}}/{{y}}.pbf", name=name, options=options)
+        self.tooltip_fields = tooltip_fields
+        self.tooltip_aliases = tooltip_aliases
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer((TILE_HOST, TILE_PORT), TileHandler)
+    print(f"Tuiles vectorielles servies sur http://{TILE_HOST}:{TILE_PORT}/<couche>/{{z}}/{{x}}/{{y}}.pbf")
+    server.serve_forever()
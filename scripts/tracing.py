@@ -0,0 +1,351 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import streamlit as st
+
+# Mesure légère des étapes coûteuses de chaque page (chargements, rendu des
+# cartes, graphiques) : durées par rerun et par session, appels servis par le
+# cache ou recalculés. Les reruns terminés sont écrits dans un JSONL tournant ;
+# SMARTSDG_METRICS_PORT expose en plus un texte au format Prometheus (/metrics).
+# SMARTSDG_TRACE=0 désactive tout ; ?debug=1 ou SMARTSDG_DEBUG=1 affiche un
+# panneau de mesures dans la barre latérale.
+TRACE_ENABLED = os.environ.get("SMARTSDG_TRACE", "1") != "0"
+TRACE_LOG = os.environ.get("SMARTSDG_TRACE_LOG", "data/cache/trace/reruns.jsonl")
+TRACE_LOG_BYTES = 5 << 20
+TRACE_LOG_BACKUPS = 3
+METRICS_HOST = os.environ.get("SMARTSDG_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.environ.get("SMARTSDG_METRICS_PORT")
+DEBUG_PANEL = os.environ.get("SMARTSDG_DEBUG") == "1"
+# Bornes (s) des histogrammes Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+RECENT_RERUNS = 200
+# Sessions inactives depuis SESSION_TTL secondes oubliées (compteurs et rerun
+# resté ouvert après une exception), au plus MAX_SESSIONS suivies à la fois
+SESSION_TTL = int(os.environ.get("SMARTSDG_TRACE_SESSION_TTL", "3600"))
+MAX_SESSIONS = 1000
+# Étapes détaillées conservées par rerun (les suivantes sont seulement comptées)
+MAX_RERUN_SPANS = 1000
+
+_local = threading.local()
+_lock = threading.Lock()
+_spans = {}
+_reruns = {}
+# Rerun en cours de chaque session (chaque rerun s'exécute dans un nouveau thread)
+_open = {}
+_sessions = OrderedDict()
+_recent = deque(maxlen=RECENT_RERUNS)
+_logger = None
+
+class _Stats:
+    """Compteurs cumulés d'une étape (ou d'une page) depuis le démarrage du processus."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, duration, cache=None):
+        self.count += 1
+        self.total += duration
+        for i, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                self.buckets[i] += 1
+        if cache == "hit":
+            self.hits += 1
+        elif cache == "miss":
+            self.misses += 1
+
+class Span:
+    def __init__(self, name, cache=False):
+        self.name = name
+        self.cache = "hit" if cache else None
+        self.depth = len(_stack())
+        self.start = 0.0
+        self.duration = 0.0
+
+    def __enter__(self):
+        _stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        _record(self)
+        return False
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        ctx = None
+    return ctx.session_id if ctx is not None else "hors-session"
+
+def _record(span):
+    with _lock:
+        _spans.setdefault(span.name, _Stats()).add(span.duration, span.cache)
+    rerun = _open.get(_session_id())
+    if rerun is not None:
+        if len(rerun["spans"]) >= MAX_RERUN_SPANS:
+            rerun["dropped_spans"] = rerun.get("dropped_spans", 0) + 1
+            return
+        rerun["spans"].append({
+            "name": span.name,
+            "depth": span.depth,
+            "duration_s": round(span.duration, 6),
+            "cache": span.cache,
+        })
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def span(name, cache=False):
+    """Mesure un bloc : `with span("show_dashboard.graphique"): ...`.
+
+    Avec `cache=True`, l'appel est compté comme servi par le cache, sauf si
+    une fonction marquée par cache_miss s'exécute pendant le bloc.
+    """
+    return Span(name, cache) if TRACE_ENABLED else _NoSpan()
+
+def traced(name=None, cache=False):
+    """Décorateur équivalent à span() autour de chaque appel de la fonction.
+
+    Pour une fonction en cache, il se place au-dessus de @st.cache_data /
+    @st.cache_resource, et cache_miss en dessous.
+    """
+    def decorator(function):
+        label = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(label, cache):
+                return function(*args, **kwargs)
+        if hasattr(function, "clear"):
+            # Fonction en cache : load_cube.clear() reste disponible
+            wrapper.clear = function.clear
+        return wrapper
+    return decorator
+
+def cache_miss(function):
+    """Marque comme recalculé l'appel mesuré en cours (n'est exécuté qu'en l'absence de cache)."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        for current in reversed(_stack()):
+            if current.cache is not None:
+                current.cache = "miss"
+                break
+        return function(*args, **kwargs)
+    return wrapper
+
+def start_rerun(page):
+    """Début d'un rerun de `page` (en tête de page) ; clôt un rerun précédent interrompu (st.stop)."""
+    if not TRACE_ENABLED:
+        return
+    session = _session_id()
+    if session in _open:
+        end_rerun(panel=False, interrupted=True)
+    _stack().clear()
+    now = time.time()
+    with _lock:
+        _prune(now)
+        number = _sessions.get(session, {}).get("reruns", 0) + 1
+        _open[session] = {
+            "id": uuid.uuid4().hex[:12],
+            "session": session,
+            "page": page,
+            "rerun": number,
+            "started": now,
+            "start": time.perf_counter(),
+            "spans": [],
+        }
+    if METRICS_PORT:
+        start_metrics_server()
+
+def end_rerun(panel=True, interrupted=False):
+    """Fin d'un rerun (en bas de page) : agrégats, ligne JSONL et panneau de debug éventuel."""
+    with _lock:
+        rerun = _open.pop(_session_id(), None)
+    if rerun is None:
+        return
+    duration = time.perf_counter() - rerun.pop("start")
+    entry = dict(rerun, duration_s=round(duration, 6), interrupted=interrupted)
+    with _lock:
+        _reruns.setdefault(entry["page"], _Stats()).add(duration)
+        session = _sessions.setdefault(entry["session"], {"reruns": 0, "total_s": 0.0, "last_seen": 0.0})
+        _sessions.move_to_end(entry["session"])
+        session["reruns"] += 1
+        session["total_s"] += duration
+        session["last_seen"] = entry["started"]
+        _recent.append(entry)
+    _write_jsonl(entry)
+    if panel and debug_enabled():
+        debug_panel(entry)
+
+def _prune(now):
+    """Oublie les sessions inactives et les reruns jamais terminés (appelé sous _lock)."""
+    expired = now - SESSION_TTL
+    # _open et _sessions sont dans l'ordre d'activité : seules les premières entrées peuvent avoir expiré
+    while _open:
+        session = next(iter(_open))
+        if _open[session]["started"] >= expired:
+            break
+        del _open[session]
+    while _sessions:
+        session, stats = next(iter(_sessions.items()))
+        if stats["last_seen"] >= expired and len(_sessions) <= MAX_SESSIONS:
+            break
+        del _sessions[session]
+
+def _write_jsonl(entry):
+    global _logger
+    if not TRACE_LOG:
+        return
+    try:
+        if _logger is None:
+            with _lock:
+                if _logger is None:
+                    os.makedirs(os.path.dirname(TRACE_LOG) or ".", exist_ok=True)
+                    handler = logging.handlers.RotatingFileHandler(
+                        TRACE_LOG, maxBytes=TRACE_LOG_BYTES, backupCount=TRACE_LOG_BACKUPS, encoding="utf-8")
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    logger = logging.getLogger("smartsdg.trace")
+                    logger.propagate = False
+                    logger.setLevel(logging.INFO)
+                    logger.addHandler(handler)
+                    _logger = logger
+        _logger.info(json.dumps(entry, ensure_ascii=False))
+    except OSError:
+        pass  # répertoire en lecture seule : les mesures restent en mémoire
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def _histogram(lines, metric, label, stats):
+    for name, s in sorted(stats.items()):
+        for bound, count in zip(BUCKETS, s.buckets):
+            lines.append(f'{metric}_bucket{{{label}="{_label(name)}",le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{label}="{_label(name)}",le="+Inf"}} {s.count}')
+        lines.append(f'{metric}_sum{{{label}="{_label(name)}"}} {s.total:.6f}')
+        lines.append(f'{metric}_count{{{label}="{_label(name)}"}} {s.count}')
+
+def prometheus_text():
+    """Métriques cumulées au format texte Prometheus."""
+    lines = []
+    with _lock:
+        lines += ["# HELP smartsdg_span_seconds Durée des étapes mesurées.",
+                  "# TYPE smartsdg_span_seconds histogram"]
+        _histogram(lines, "smartsdg_span_seconds", "span", _spans)
+        lines += ["# HELP smartsdg_cache_hits_total Appels servis par le cache Streamlit.",
+                  "# TYPE smartsdg_cache_hits_total counter"]
+        lines += [f'smartsdg_cache_hits_total{{span="{_label(n)}"}} {s.hits}' for n, s in sorted(_spans.items()) if s.hits or s.misses]
+        lines += ["# HELP smartsdg_cache_misses_total Appels recalculés faute de cache.",
+                  "# TYPE smartsdg_cache_misses_total counter"]
+        lines += [f'smartsdg_cache_misses_total{{span="{_label(n)}"}} {s.misses}' for n, s in sorted(_spans.items()) if s.hits or s.misses]
+        lines += ["# HELP smartsdg_rerun_seconds Durée des reruns par page.",
+                  "# TYPE smartsdg_rerun_seconds histogram"]
+        _histogram(lines, "smartsdg_rerun_seconds", "page", _reruns)
+        lines += ["# HELP smartsdg_sessions Sessions ayant exécuté au moins un rerun.",
+                  "# TYPE smartsdg_sessions gauge",
+                  f"smartsdg_sessions {len(_sessions)}"]
+
+    from scripts.registry import REGISTRY
+    report = REGISTRY.memory_report()
+    lines += ["# HELP smartsdg_registry_bytes Mémoire estimée des données de référence partagées.",
+              "# TYPE smartsdg_registry_bytes gauge"]
+    lines += [f'smartsdg_registry_bytes{{entry="{_label(name)}"}} {int(size * 1e6)}'
+              for name, size in zip(report["entrée"], report["taille_mo"])]
+    lines += ["# HELP smartsdg_registry_generation Nombre de chargements de chaque entrée.",
+              "# TYPE smartsdg_registry_generation gauge"]
+    lines += [f'smartsdg_registry_generation{{entry="{_label(name)}"}} {generation}'
+              for name, generation in zip(report["entrée"], report["génération"])]
+    return "\n".join(lines) + "\n"
+
+def session_summary(session=None):
+    """Reruns récents d'une session (par défaut la session courante), du plus récent au plus ancien."""
+    session = session or _session_id()
+    with _lock:
+        return [entry for entry in reversed(_recent) if entry["session"] == session]
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        data = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@st.cache_resource
+def start_metrics_server():
+    """Démarre le serveur /metrics dans un thread (une seule fois par processus)."""
+    try:
+        server = ThreadingHTTPServer((METRICS_HOST, int(METRICS_PORT)), MetricsHandler)
+    except (OSError, ValueError):
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-server").start()
+    return f"http://{METRICS_HOST}:{METRICS_PORT}/metrics"
+
+def debug_enabled():
+    if DEBUG_PANEL:
+        return True
+    try:
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+def debug_panel(entry):
+    """Étapes du rerun qui vient de se terminer et reruns récents de la session."""
+    import pandas as pd
+
+    with st.sidebar.expander(f"⏱️ Mesures : {entry['duration_s'] * 1000:.0f} ms", expanded=False):
+        spans = pd.DataFrame(entry["spans"], columns=["name", "depth", "duration_s", "cache"])
+        spans["name"] = ["· " * depth + name for name, depth in zip(spans["name"], spans["depth"])]
+        st.dataframe(
+            spans.drop(columns="depth").assign(duration_s=spans["duration_s"] * 1000),
+            hide_index=True,
+            column_config={
+                "name": "Étape",
+                "duration_s": st.column_config.NumberColumn("Durée (ms)", format="%.1f"),
+                "cache": "Cache",
+            },
+        )
+        history = session_summary(entry["session"])
+        st.caption(f"Session : {len(history)} rerun(s) récent(s), "
+                   f"{sum(e['duration_s'] for e in history):.2f} s au total")
+
+        from scripts.registry import REGISTRY
+        report = REGISTRY.memory_report()
+        st.dataframe(report[["entrée", "génération", "taille_mo"]], hide_index=True,
+                     column_config={"taille_mo": st.column_config.NumberColumn("Mo", format="%.2f")})
+        st.caption(f"Données de référence partagées : {report['taille_mo'].sum():.1f} Mo")
+        if st.button("Recharger les données de référence", key="reload_registry"):
+            dropped = REGISTRY.reload()
+            st.caption("Rechargées au prochain affichage : " + (", ".join(dropped) or "aucune (fichiers inchangés)"))
@@ -0,0 +1,84 @@
+import importlib
+import os
+import threading
+import time
+import streamlit as st
+from scripts.tracing import span
+
+# Préchauffage au démarrage du serveur : un thread (un seul par processus)
+# importe les bibliothèques cartographiques et remplit les caches partagés,
+# pendant que le premier visiteur est encore sur l'accueil. Une page qui
+# demande une valeur en cours de calcul attend ce calcul au lieu de le refaire.
+# SMARTSDG_WARMUP=0 le désactive.
+WARMUP_ENABLED = os.environ.get("SMARTSDG_WARMUP", "1") != "0"
+HEAVY_MODULES = ["pandas", "pyarrow.dataset", "shapely", "geopandas", "plotly.express", "folium", "streamlit_folium"]
+
+def _import_modules():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+def _geodata():
+    from scripts.geo_utils import load_geodata
+    load_geodata()
+
+def _spatial_index():
+    from scripts.geo_utils import load_spatial_index, load_gouvernorats
+    load_spatial_index()
+    load_gouvernorats()
+
+def _boundaries():
+    from scripts.geo_utils import LOD_LEVELS, load_boundaries
+    for level in range(len(LOD_LEVELS)):
+        load_boundaries(level)
+
+def _bio():
+    from scripts.bio_utils import BIO_PATH, load_bio_data, bio_indicators
+    from scripts.data_utils import frame_digest
+    df_bio = load_bio_data(BIO_PATH)
+    bio_indicators(frame_digest(df_bio), df_bio)
+
+# Étapes dans l'ordre où les pages en ont besoin
+STEPS = [
+    ("imports", _import_modules),
+    ("geodata", _geodata),
+    ("spatial_index", _spatial_index),
+    ("boundaries", _boundaries),
+    ("bio", _bio),
+]
+
+def warm_caches(status=None):
+    """Exécute chaque étape ; une étape en échec n'empêche pas les suivantes."""
+    status = status if status is not None else {"timings": {}, "errors": {}}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            with span(f"warmup.{name}"):
+                step()
+        except Exception as e:
+            status["errors"][name] = str(e)
+        status["timings"][name] = round(time.perf_counter() - start, 3)
+    return status
+
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    """Lance le préchauffage en arrière-plan (une seule fois par processus) ; retourne son état."""
+    status = {"timings": {}, "errors": {}, "done": threading.Event()}
+    if not WARMUP_ENABLED:
+        status["done"].set()
+        return status
+
+    def run():
+        try:
+            warm_caches(status)
+        finally:
+            status["done"].set()
+
+    threading.Thread(target=run, daemon=True, name="cache-warmup").start()
+    return status
+
+if __name__ == "__main__":
+    # Avant un déploiement : compile les fonds de carte (GeoParquet, niveaux de
+    # détail) et vérifie que chaque étape passe : python -m scripts.warmup
+    result = warm_caches()
+    for name, seconds in result["timings"].items():
+        print(f"{name:<15} {seconds:7.3f} s  {result['errors'].get(name, '')}")
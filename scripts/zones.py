@@ -0,0 +1,55 @@
+import re
+import unicodedata
+import pandas as pd
+import shapely
+import streamlit as st
+from scripts.html_utils import sanitize_html
+from scripts.tracing import traced, cache_miss
+
+# Zones d'intervention (ODESYPANO) : fiches HTML nettoyées une fois pour toutes,
+# et contours simplifiés pour la carte (~50 m, coordonnées arrondies à ~1 m)
+ZONE_TOLERANCE = 0.0005
+ZONE_PRECISION = 1e-5
+PAGE_SIZES = [10, 25, 50]
+
+def fold(text):
+    """Minuscules sans accents ni espaces multiples, pour la recherche."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+@traced("prepare_zones", cache=True)
+@st.cache_data(show_spinner=False)
+@cache_miss
+def prepare_zones(version, _gdf):
+    """Nom, description HTML nettoyée et texte de recherche de chaque zone (`version` identifie `_gdf`)."""
+    names = _gdf["Name"].astype(str) if "Name" in _gdf else pd.Series(_gdf.index.astype(str))
+    descriptions = _gdf["description"] if "description" in _gdf else pd.Series([None] * len(_gdf))
+    rendered = [sanitize_html(d) for d in descriptions]
+    zones = pd.DataFrame({
+        "name": names.to_numpy(),
+        "html": [html for html, _ in rendered],
+    })
+    zones["search"] = [fold(f"{name} {text}") for name, (_, text) in zip(zones["name"], rendered)]
+    return zones
+
+def search_zones(zones, query):
+    """Zones dont le nom ou la description contient `query` (sans tenir compte des accents)."""
+    query = fold(query)
+    if not query:
+        return zones
+    return zones[zones["search"].str.contains(query, regex=False)]
+
+def page_of(zones, page, page_size):
+    start = (page - 1) * page_size
+    return zones.iloc[start:start + page_size]
+
+@traced("zone_layer", cache=True)
+@st.cache_data(show_spinner=False)
+@cache_miss
+def zone_layer(version, _gdf, tolerance=ZONE_TOLERANCE):
+    """Contours simplifiés (topologie préservée) et allégés, avec le seul nom en attribut."""
+    layer = _gdf[["Name", "geometry"]].copy() if "Name" in _gdf else _gdf[["geometry"]].copy()
+    simplified = layer.geometry.simplify(tolerance, preserve_topology=True)
+    layer["geometry"] = shapely.set_precision(simplified.values, ZONE_PRECISION)
+    return layer[~layer.geometry.is_empty]
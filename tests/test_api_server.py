@@ -0,0 +1,26 @@
+import json
+import numpy as np
+import pandas as pd
+from scripts.api_server import encode
+
+def test_scalars_encode_as_json_numbers_and_null():
+    result = {
+        "stations": [np.int64(3), np.int64(5)],
+        "relevés": np.int64(12),
+        "cumul": np.float32(1.5),
+        "max_jour": float("nan"),
+        "dernier_relevé": {"Pluvio_du_jour": np.nan, "Cumul_mensuel": np.float64(4.2)},
+        "date_dernier_relevé": pd.Timestamp("2021-08-31"),
+        "manquant": pd.NA,
+    }
+    body = b"".join(encode(result, "json")).decode("utf-8")
+    assert json.loads(body) == {
+        "stations": [3, 5],
+        "relevés": 12,
+        "cumul": 1.5,
+        "max_jour": None,
+        "dernier_relevé": {"Pluvio_du_jour": None, "Cumul_mensuel": 4.2},
+        "date_dernier_relevé": "2021-08-31",
+        "manquant": None,
+    }
+    assert "NaN" not in body
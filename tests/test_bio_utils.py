@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+from scripts.bio_utils import BIO_ID, _indicators, as_int, indicator_row, top_n
+
+def test_indicators_with_missing_values():
+    df = pd.DataFrame({
+        BIO_ID: ["Tunis", "Sousse", "Sfax"],
+        "OLIVIER": [10.0, np.nan, 30.0],
+    })
+    indicators = _indicators(df, BIO_ID)
+    ranks = indicators["table"][("rang", "OLIVIER")]
+    assert ranks["Sfax"] == 1 and ranks["Tunis"] == 2
+    assert pd.isna(ranks["Sousse"])
+    assert top_n(indicators, "OLIVIER", 2)[BIO_ID].tolist() == ["Sfax", "Tunis"]
+    assert as_int(indicator_row(indicators, "Sousse").loc["OLIVIER", "rang"]) == "—"
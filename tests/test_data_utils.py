@@ -0,0 +1,63 @@
+import pandas as pd
+from scripts.data_utils import derive_cumuls
+
+def readings(dates, rain, month, period, station="باردو"):
+    return pd.DataFrame({
+        'Date': pd.to_datetime(dates),
+        'station': station,
+        'Pluvio_du_jour': pd.Series(rain, dtype="float32"),
+        'Cumul_du_mois': pd.Series(month, dtype="float32"),
+        'Cumul_periode': pd.Series(period, dtype="float32"),
+    })
+
+def test_file_starting_mid_month_keeps_its_cumuls():
+    df = derive_cumuls(readings(
+        ["2024-01-15", "2024-01-16", "2024-01-17"],
+        [2.0, 0.0, 1.5],
+        [8.5, 8.5, 10.0],
+        [120.0, 120.0, 121.5],
+    ))
+    assert df['Cumul_du_mois'].tolist() == [8.5, 8.5, 10.0]
+    assert df['Cumul_periode'].tolist() == [120.0, 120.0, 121.5]
+    assert not df['Cumul_incoherent'].any()
+
+def test_inconsistent_row_is_flagged_and_corrected():
+    df = derive_cumuls(readings(
+        ["2024-01-15", "2024-01-16", "2024-01-17"],
+        [2.0, 3.0, 1.5],
+        [8.5, 9.0, 12.0],
+        [120.0, 123.0, 124.5],
+    ))
+    assert df['Cumul_du_mois'].tolist() == [8.5, 11.5, 13.0]
+    assert df['Cumul_incoherent'].tolist() == [False, True, True]
+
+def test_new_month_starts_from_zero():
+    df = derive_cumuls(readings(
+        ["2024-01-31", "2024-02-01"],
+        [2.0, 1.0],
+        [30.0, 5.0],
+        [120.0, 121.0],
+    ))
+    assert df['Cumul_du_mois'].tolist() == [30.0, 1.0]
+    assert df['Cumul_incoherent'].tolist() == [False, True]
+
+def test_file_starting_on_first_day_is_not_seeded():
+    df = derive_cumuls(readings(["2023-09-01"], [2.0], [8.5], [8.5]))
+    assert df['Cumul_du_mois'].tolist() == [2.0]
+    assert df['Cumul_incoherent'].tolist() == [True]
+
+def test_data_key_is_cheap_for_tagged_frames_only(monkeypatch):
+    from scripts import data_utils
+    df = pd.DataFrame({'Date': pd.date_range("2021-01-01", periods=4), 'station': list("aabb"), 'Pluvio_du_jour': [0.0, 1.0, 2.0, 3.0]})
+    tagged = data_utils.tag_frame(df, "import", "abc", True)
+    subset = tagged[tagged['station'] == "a"]
+    assert subset.attrs.get('data_key') is not None  # hérité de la source
+
+    hashed = []
+    digest = data_utils.frame_digest
+    monkeypatch.setattr(data_utils, "frame_digest", lambda d: hashed.append(len(d)) or digest(d))
+    assert data_utils.data_key(tagged) == data_utils.data_key(tagged)
+    assert hashed == []
+    assert data_utils.data_key(subset) != data_utils.data_key(tagged)
+    assert hashed == [2]
+    assert data_utils.data_key(data_utils.tag_frame(subset, "import", "abc", True, ("a",))) != data_utils.data_key(tagged)
@@ -0,0 +1,46 @@
+import pytest
+from scripts.geo_utils import find_clicked_gouvernorat, load_spatial_index
+
+# Points situés à l'intérieur d'un gouvernorat connu
+POINTS = {
+    "Tunis": (36.80, 10.18),
+    "Bizerte": (37.27, 9.87),
+    "Sousse": (35.83, 10.63),
+    "Kasserine": (35.17, 8.83),
+    "Mednine": (33.35, 10.50),
+}
+
+@pytest.mark.parametrize("name", POINTS)
+def test_clicked_gouvernorat_has_its_own_name(name):
+    lat, lng = POINTS[name]
+    gouv = find_clicked_gouvernorat({'lat': lat, 'lng': lng})
+    assert gouv is not None
+    assert gouv['gouv_fr'] == name
+
+def test_click_outside_tunisia():
+    assert find_clicked_gouvernorat({'lat': 0.0, 'lng': 0.0}) is None
+
+def test_lookup_outside_delegations_uses_repaired_gouvernorats():
+    index = load_spatial_index()
+    for name, (lat, lng) in POINTS.items():
+        pos = index.locate_gouv([lng], [lat])[0]
+        assert index.gdf_gouv.iloc[pos]['gouv_fr'] == name
+
+@pytest.mark.parametrize("clean, simplify", [(False, True), (False, False)])
+def test_simplify_coverage_without_recent_geos(monkeypatch, clean, simplify):
+    from scripts import geo_utils
+    monkeypatch.setattr(geo_utils, "HAS_COVERAGE_CLEAN", clean)
+    monkeypatch.setattr(geo_utils, "HAS_COVERAGE_SIMPLIFY", simplify)
+    gdf_gouv, _ = geo_utils.load_geodata()
+    levels = geo_utils.simplify_coverage(gdf_gouv)
+    assert len(levels) == len(geo_utils.LOD_LEVELS)
+    assert all(len(level) == len(gdf_gouv) and not level.geometry.is_empty.any() for level in levels)
+
+@pytest.mark.parametrize("level", range(3))
+def test_simplified_gouvernorats_keep_repaired_names(level):
+    import shapely
+    from scripts.geo_utils import load_boundaries
+    gdf_gouv, _ = load_boundaries(level)
+    for name, (lat, lng) in POINTS.items():
+        inside = gdf_gouv[gdf_gouv.geometry.contains(shapely.Point(lng, lat))]
+        assert inside['gouv_fr'].tolist() == [name]
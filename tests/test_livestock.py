@@ -0,0 +1,20 @@
+import urllib.error
+from scripts import livestock
+
+def test_failed_downloads_are_reported_not_raised(monkeypatch):
+    def download(url):
+        if url.endswith("http.xlsx"):
+            raise urllib.error.HTTPError(url, 503, "Service Unavailable", None, None)
+        if url.endswith("invalide.xlsx"):
+            raise ValueError(f"unknown url type: {url}")
+        return f"/tmp/{url}", "v1"
+    monkeypatch.setattr(livestock, "download", download)
+    manifest = [
+        {"gouvernorat": "Tozeur", "url": "tozeur.xlsx"},
+        {"gouvernorat": "Gafsa", "url": "http.xlsx"},
+        {"gouvernorat": "Kebili", "url": "invalide.xlsx"},
+        {"gouvernorat": "Sfax"},
+    ]
+    files, failures = livestock.fetch_workbooks(manifest)
+    assert files == [("Tozeur", "/tmp/tozeur.xlsx", "v1")]
+    assert [name for name, _ in failures] == ["Gafsa", "Kebili", "Sfax"]
@@ -0,0 +1,35 @@
+import folium
+import pytest
+from scripts import map_utils
+
+STYLE = {'fillColor': '#ffffff'}
+
+def build():
+    m = folium.Map(location=[34, 9], zoom_start=6)
+    folium.GeoJson({"type": "FeatureCollection", "features": []}, name="Délégations").add_to(m)
+    return m
+
+@pytest.fixture
+def plain(monkeypatch):
+    shown = []
+    monkeypatch.setattr(map_utils, "st_folium", lambda m, **kwargs: shown.append(m) or {"zoom": 6})
+    return shown
+
+def test_missing_private_function_falls_back_to_st_folium(monkeypatch, plain):
+    monkeypatch.delattr(map_utils.streamlit_folium, "_get_map_string")
+    monkeypatch.setattr(map_utils, "_private_api_ok", all(hasattr(map_utils.streamlit_folium, n) for n in map_utils.PRIVATE_API))
+    restyle = {"Délégations": ("del_id", {"TN11A": dict(STYLE, fillColor="#123456")}, STYLE)}
+
+    assert map_utils.st_folium_cached({"test": "absente"}, build, key="carte", restyle=restyle) == {"zoom": 6}
+    html = plain[0].get_root().render()
+    assert "#123456" in html
+
+def test_changed_private_signature_falls_back_to_st_folium(monkeypatch, plain):
+    monkeypatch.setattr(map_utils, "_private_api_ok", True)
+    def old_signature(script, key):
+        return script
+    monkeypatch.setattr(map_utils.streamlit_folium, "generate_js_hash", old_signature)
+
+    assert map_utils.st_folium_cached({"test": "signature"}, build, key="carte") == {"zoom": 6}
+    assert len(plain) == 1
+    assert map_utils._private_api_ok is False
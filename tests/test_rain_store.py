@@ -0,0 +1,46 @@
+import os
+import pandas as pd
+import pytest
+from scripts import rain_store
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    directory = str(tmp_path / "pluviometrie")
+    monkeypatch.setattr(rain_store, "STORE_DIR", directory)
+    monkeypatch.setattr(rain_store, "UPLOADS_DIR", os.path.join(directory, "_uploads"))
+    monkeypatch.setattr(rain_store, "VERSION_FILE", os.path.join(directory, "_version"))
+    return directory
+
+def readings(start, end, rain=1.0, station="باردو"):
+    dates = pd.date_range(start, end, freq="D")
+    return pd.DataFrame({
+        'Date': dates,
+        'station': station,
+        'Pluvio_du_jour': pd.Series(rain, index=range(len(dates)), dtype="float32"),
+        'Cumul_du_mois': pd.Series(0.0, index=range(len(dates)), dtype="float32"),
+        'Cumul_periode': pd.Series(0.0, index=range(len(dates)), dtype="float32"),
+    })
+
+def test_partial_year_upload_keeps_other_days(store):
+    rain_store.write_rainfall(readings("2024-01-01", "2024-03-31"))
+    rain_store.write_rainfall(readings("2024-06-01", "2024-06-30", rain=2.0))
+
+    stored = rain_store.query_rainfall()
+    assert len(stored) == 91 + 30
+    assert stored['Date'].min() == pd.Timestamp("2024-01-01")
+    assert stored.loc[stored['Date'].dt.month == 6, 'Pluvio_du_jour'].eq(2.0).all()
+
+def test_upload_replaces_same_days(store):
+    rain_store.write_rainfall(readings("2024-01-01", "2024-01-31"))
+    upload = readings("2024-01-10", "2024-01-12", rain=5.0)
+    assert len(rain_store.replaced_rows(upload)) == 3
+    rain_store.write_rainfall(upload)
+
+    stored = rain_store.query_rainfall()
+    assert len(stored) == 31
+    assert stored.loc[stored['Pluvio_du_jour'] == 5.0, 'Date'].dt.day.tolist() == [10, 11, 12]
+
+def test_other_stations_untouched(store):
+    rain_store.write_rainfall(readings("2024-01-01", "2024-01-31", station="قرطاج"))
+    rain_store.write_rainfall(readings("2024-01-01", "2024-01-31"))
+    assert len(rain_store.query_rainfall(stations=["قرطاج"])) == 31
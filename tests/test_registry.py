@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from scripts import registry
+from scripts.registry import Registry
+
+def test_caller_writes_do_not_reach_the_entry():
+    reg = Registry()
+    reg.register("table", lambda: pd.DataFrame({"a": [1, 2, 3]}))
+    first = reg.get("table")
+    first.loc[0, "a"] = 99
+    first["a"] += 1
+    assert reg.get("table")["a"].tolist() == [1, 2, 3]
+
+def test_view_is_a_deep_copy_without_copy_on_write(monkeypatch):
+    monkeypatch.setattr(registry, "copy_on_write", lambda: False)
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    view = registry.view(df)
+    assert not np.shares_memory(view["a"].to_numpy(), df["a"].to_numpy())
+
+def test_family_keeps_the_most_recently_read_entries():
+    reg = Registry()
+    for key in range(3):
+        reg.register(f"ind:{key}", lambda key=key: key, family="ind", max_entries=2)
+        reg.get(f"ind:{key}")
+        if key == 1:
+            reg.get("ind:0")
+    report = reg.memory_report()
+    assert sorted(report["entrée"]) == ["ind:0", "ind:2"]
@@ -0,0 +1,18 @@
+import pandas as pd
+from scripts.reports import generate_reports
+
+def test_readings_without_any_matching_station(tmp_path):
+    dates = pd.date_range("2021-01-01", periods=3)
+    df = pd.DataFrame({
+        'Date': dates,
+        'station': pd.Categorical(["Station inconnue"] * 3),
+        'Pluvio_du_jour': [0.0, 1.5, 2.0],
+        'Cumul_du_mois': [0.0, 1.5, 3.5],
+        'Cumul_periode': [0.0, 1.5, 3.5],
+    })
+    index = generate_reports(df, dates[0], dates[-1], out=str(tmp_path), workers=1)
+
+    summary = pd.read_csv(tmp_path / "summary.csv")
+    assert summary['cumul'].isna().all()
+    with open(index, encoding="utf-8") as f:
+        assert "Aucune station" in f.read()
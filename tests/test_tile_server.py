@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import pytest
+import shapely
+from scripts.tile_server import get_source
+
+# Points situés à l'intérieur d'un gouvernorat connu (lat, lon)
+POINTS = {
+    "Tunis": (36.80, 10.18),
+    "Bizerte": (37.27, 9.87),
+    "Sousse": (35.83, 10.63),
+}
+
+def _mercator(lat, lon):
+    r = 6378137.0
+    return shapely.Point(r * np.radians(lon), r * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2)))
+
+@pytest.mark.parametrize("level", range(3))
+def test_gouvernorat_tiles_carry_repaired_names(level):
+    tree, geoms, props = get_source("gouvernorats").level(level)
+    for name, (lat, lon) in POINTS.items():
+        point = _mercator(lat, lon)
+        hits = [i for i in tree.query(point) if geoms[i].contains(point)]
+        assert [props[i]['gouv_fr'] for i in hits] == [name]
+
+def test_touched_geojson_is_hashed_once(monkeypatch, tmp_path):
+    from scripts import tile_server
+    path = tmp_path / "gouvernorats.geojson"
+    path.write_text('{"type": "FeatureCollection", "features": []}')
+    monkeypatch.setitem(tile_server.LAYERS, "test", (str(path), ['gouv_id']))
+    monkeypatch.setitem(tile_server._SOURCES, "test", None)
+    monkeypatch.setattr(tile_server, "TILE_CACHE_DIR", str(tmp_path / "tiles"))
+    source = get_source("test")
+    os.utime(path, (source.mtime + 10, source.mtime + 10))
+
+    hashed = []
+    digest = tile_server.file_digest
+    monkeypatch.setattr(tile_server, "file_digest", lambda p: hashed.append(p) or digest(p))
+    assert get_source("test") is source
+    assert get_source("test") is source
+    assert len(hashed) == 1
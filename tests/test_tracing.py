@@ -0,0 +1,30 @@
+import scripts.tracing as tracing
+
+def test_idle_sessions_and_abandoned_reruns_are_pruned(monkeypatch):
+    monkeypatch.setattr(tracing, "_open", {})
+    monkeypatch.setattr(tracing, "_sessions", tracing.OrderedDict())
+    monkeypatch.setattr(tracing, "MAX_SESSIONS", 3)
+    now = 10_000.0
+    # Rerun interrompu par une exception : jamais clos par end_rerun
+    tracing._open["abandonnée"] = {"started": now - tracing.SESSION_TTL - 1, "spans": [{}] * 50}
+    tracing._open["en cours"] = {"started": now - 1, "spans": []}
+    tracing._sessions["inactive"] = {"reruns": 1, "total_s": 0.1, "last_seen": now - tracing.SESSION_TTL - 1}
+    for i in range(4):
+        tracing._sessions[f"active-{i}"] = {"reruns": 1, "total_s": 0.1, "last_seen": now - 10 + i}
+
+    tracing._prune(now)
+
+    assert list(tracing._open) == ["en cours"]
+    assert list(tracing._sessions) == ["active-1", "active-2", "active-3"]
+
+def test_spans_per_rerun_are_capped(monkeypatch):
+    monkeypatch.setattr(tracing, "_open", {})
+    monkeypatch.setattr(tracing, "MAX_RERUN_SPANS", 5)
+    tracing.start_rerun("Test")
+    for _ in range(8):
+        with tracing.span("étape"):
+            pass
+    rerun = tracing._open[tracing._session_id()]
+    assert len(rerun["spans"]) == 5
+    assert rerun["dropped_spans"] == 3
+    tracing._open.clear()